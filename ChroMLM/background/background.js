@@ -53,7 +53,7 @@ chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
 chrome.runtime.onMessage.addListener(function(message, sender, sendResponse) {
   if (message.action === 'analyzePost') {
     console.log('Background received analyze request for: ', message.url);
-    analyzePost(message.url)
+    analyzePost(message.url, message.priority)
       .then(result => {
         console.log('Analysis complete: ', result);
         sendResponse({ success: true, result: result });
@@ -71,35 +71,45 @@ chrome.runtime.onMessage.addListener(function(message, sender, sendResponse) {
   }
 });
 
-async function analyzePost(url) {
+const API_BASE = 'http://127.0.0.1:8000';
+
+async function analyzePost(url, priority = 'interactive') {
   try {
-    console.log('Sending request to API:', url);
-    const apiUrl = 'http://127.0.0.1:8000/analyze/';
-    
-    const response = await fetch(apiUrl, {
+    console.log('Submitting analysis job:', url, priority);
+    const response = await fetch(`${API_BASE}/jobs`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json'
       },
-      body: JSON.stringify({ url: url })
+      body: JSON.stringify({ url: url, priority: priority })
     });
     
     console.log('API response status:', response.status);
     
+    if (response.status === 503) {
+      const retryAfter = response.headers.get('Retry-After');
+      throw new Error(`Server busy, try again in ${retryAfter || 'a few'} seconds`);
+    }
     if (!response.ok) {
       throw new Error(`API error: ${response.status}`);
     }
     
-    try {
-      const jsonData = await response.json();
-      console.log('API response data:', jsonData);
-      return jsonData;
-    } catch (jsonError) {
-      console.error('Error parsing JSON response:', jsonError);
-      throw new Error('Failed to parse API response');
+    let job = await response.json();
+    while (job.status !== 'done' && job.status !== 'failed') {
+      const poll = await fetch(`${API_BASE}/jobs/${job.job_id}?wait=25`);
+      if (!poll.ok) {
+        throw new Error(`API error: ${poll.status}`);
+      }
+      job = await poll.json();
+    }
+    console.log('Job finished:', job);
+    
+    if (job.status === 'failed') {
+      return { error: job.error };
     }
+    return job.result;
   } catch (error) {
     console.error('Error in analyzePost:', error);
     throw error;
   }
-}
\ No newline at end of file
+}
@@ -163,10 +163,10 @@ function createWidget() {
   document.querySelector('.ig-mlm-close').addEventListener('click', hideWidget);
   document.querySelector('.ig-mlm-minimize').addEventListener('click', minimizeWidget);
   document.getElementById('ig-mlm-retry')?.addEventListener('click', () => {
-    analyzeCurrentPost();
+    analyzeCurrentPost('interactive');
   });
   document.getElementById('ig-mlm-analyze')?.addEventListener('click', () => {
-    analyzeCurrentPost();
+    analyzeCurrentPost('interactive');
   });
   console.log('MLM Detector: Widget created');
 }
@@ -468,7 +468,7 @@ function checkAndAnalyzePost(url = window.location.href) {
       const waitingElement = document.getElementById('ig-mlm-waiting');
       if (waitingElement) waitingElement.classList.add('hidden');
     } else if (settings.autoAnalyze) {
-      analyzeCurrentPost();
+      analyzeCurrentPost('background');
     } else {
       const waitingElement = document.getElementById('ig-mlm-waiting');
       const loadingElement = document.getElementById('ig-mlm-loading');
@@ -481,7 +481,7 @@ function checkAndAnalyzePost(url = window.location.href) {
     }
   });
 }
-function analyzeCurrentPost() {
+function analyzeCurrentPost(priority = 'interactive') {
   const currentUrl = window.location.href;
   if (!isInstagramPost(currentUrl)) {
     return;
@@ -499,7 +499,7 @@ function analyzeCurrentPost() {
   if (resultElement) resultElement.classList.add('hidden');
   if (errorElement) errorElement.classList.add('hidden');
   chrome.runtime.sendMessage(
-    { action: 'analyzePost', url: currentUrl },
+    { action: 'analyzePost', url: currentUrl, priority: priority },
     function(response) {
       analysisInProgress = false;
       if (response && response.success) {
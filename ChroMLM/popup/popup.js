@@ -150,8 +150,11 @@ document.addEventListener('DOMContentLoaded', function() {
         headers: {
           'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ url: url })
+        body: JSON.stringify({ url: url, priority: 'interactive' })
       });
+      if (response.status === 503) {
+        throw new Error(`Server busy, try again in ${response.headers.get('Retry-After') || 'a few'} seconds`);
+      }
       if (!response.ok) {
         throw new Error(`API error: ${response.status}`);
       }
@@ -1,11 +1,17 @@
+import argparse
+import hashlib
 import logging
 import json
+import os
+import sqlite3
 import re
 import pandas as pd
-from datasets import load_dataset, concatenate_datasets, Dataset
+from datasets import load_dataset, load_from_disk, concatenate_datasets, Dataset
 from openai import OpenAI, APIError, RateLimitError, APIConnectionError
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
 import time 
 
 
@@ -20,7 +26,18 @@ MODELS_TO_TEST = [
 
 LMSTUDIO_BASE_URL = "http://localhost:1234/v1"
 LMSTUDIO_API_KEY = "lm-studio" 
+OUTPUT_RESULTS_FILE = "llm_evaluation_results.jsonl"
 OUTPUT_CSV_FILE = "llm_evaluation_results.csv"
+COMPLETION_CACHE_FILE = "llm_completion_cache.sqlite3"
+SAMPLING_PARAMS = {"temperature": 0.1}
+PREPARED_DATA_DIR = "prepared_data"
+# Bump whenever standardize_data changes so stale prepared datasets are not reused.
+PREPARATION_VERSION = 1
+PREPARE_BATCH_SIZE = 1000
+PREPARE_NUM_PROC = os.cpu_count() or 1
+STANDARDIZED_COLUMN = "standardized"
+COMMENT_SPLIT_PATTERN = re.compile(r';\s*')
+COMMENT_AUTHOR_PATTERN = re.compile(r"^\s*[^:]+:\s*(.*)")
 GROUND_TRUTH_LABEL = "is_mlm"
 SYSTEM_PROMPT = (
     "You are an expert in identifying multi-level marketing (MLM) schemes on social media. "
@@ -32,7 +49,109 @@ SYSTEM_PROMPT = (
     "- 'certainty': A percentage (0-100) representing how certain you are.\n"
     "- 'reasoning': A brief explanation for your verdict." 
 )
-API_DELAY = 1 
+MAX_WORKERS = 4
+REQUESTS_PER_SECOND = 4.0
+MIN_REQUESTS_PER_SECOND = 0.25
+MAX_API_ATTEMPTS = 5
+
+
+class RateLimiter:
+    """Thread-safe request pacer shared by all workers.
+
+    The interval between requests doubles when LM Studio reports rate-limit or
+    connection errors and shrinks back gradually on every successful call.
+    """
+
+    def __init__(self, rate: float, min_rate: float):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.rate
+        time.sleep(max(0.0, slot - now))
+
+    def backoff(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._next_slot = max(self._next_slot, time.monotonic() + 1 / self.rate)
+        logging.warning(f"Backing off to {self.rate:.2f} requests/s")
+
+    def recover(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * 1.1)
+
+
+rate_limiter = RateLimiter(REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND)
+
+
+class CompletionCache:
+    """On-disk cache of raw completions keyed by everything that determines the model's output.
+
+    With ``enabled`` off the cache is neither read nor written; with ``refresh``
+    on, entries are re-queried and overwritten.
+    """
+
+    def __init__(self, path: str, enabled: bool = True, refresh: bool = False):
+        self.path = path
+        self.enabled = enabled
+        self.refresh = refresh
+        self.counters = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._conn = None
+        if enabled:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, model_id TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def key(model_identifier: str, messages: list[dict], params: dict) -> str:
+        payload = json.dumps({"model": model_identifier, "messages": messages, "params": params},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled or self.refresh:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM completions WHERE key = ?", (key,)).fetchone()
+            self.counters["hits" if row else "misses"] += 1
+        return row[0] if row else None
+
+    def set(self, key: str, model_identifier: str, content: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model_id, content, created_at) VALUES (?, ?, ?, ?)",
+                (key, model_identifier, content, time.time())
+            )
+
+    def clear(self, model_identifier: str | None = None) -> int:
+        """Deletes cached completions, for one model or all of them."""
+        if not self.enabled:
+            return 0
+        with self._lock:
+            if model_identifier is None:
+                cursor = self._conn.execute("DELETE FROM completions")
+            else:
+                cursor = self._conn.execute("DELETE FROM completions WHERE model_id = ?", (model_identifier,))
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {**self.counters, "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0}
+
+
+completion_cache = CompletionCache(COMPLETION_CACHE_FILE, enabled=False)
 
 def parse_tags(tags_str: str | None) -> list[str]:
     """Parses a comma-separated string of tags into a list."""
@@ -50,11 +169,11 @@ def parse_comments(comment_str: str | None) -> list[dict]:
     if not comment_str or not isinstance(comment_str, str):
         return comments_list
     try:
-        raw_comments = re.split(r';\s*', comment_str)
+        raw_comments = COMMENT_SPLIT_PATTERN.split(comment_str)
         for raw_comment in raw_comments:
             if not raw_comment.strip():
                 continue
-            match = re.match(r"^\s*[^:]+:\s*(.*)", raw_comment.strip())
+            match = COMMENT_AUTHOR_PATTERN.match(raw_comment.strip())
             if match:
                 comment_text = match.group(1).strip()
                 comments_list.append({"comment": comment_text})
@@ -99,27 +218,87 @@ def standardize_data(row: dict) -> dict:
     }
     return standardized
 
+def standardize_batch(batch: dict) -> dict:
+    """Standardizes a batch of rows into a JSON column, keeping the Arrow schema flat."""
+    rows = (dict(zip(batch.keys(), values)) for values in zip(*batch.values()))
+    return {STANDARDIZED_COLUMN: [json.dumps(standardize_data(row), ensure_ascii=False) for row in rows]}
+
+def label_batch(batch: dict, label: int) -> dict:
+    return {GROUND_TRUTH_LABEL: [label] * len(next(iter(batch.values())))}
+
 def load_and_prepare_data(mlm_repo: str, non_mlm_repo: str) -> Dataset:
-    """Loads MLM and non-MLM datasets, adds labels, and combines them."""
+    """Loads MLM and non-MLM datasets, adds labels, combines and standardizes them.
+
+    The prepared dataset is saved under ``PREPARED_DATA_DIR`` keyed by the
+    fingerprints of both sources, so repeat runs load it from disk instead.
+    """
     logging.info(f"Loading MLM dataset from {mlm_repo}...")
     mlm_ds = load_dataset(mlm_repo, split='train')
     logging.info(f"Loading non-MLM dataset from {non_mlm_repo}...")
     non_mlm_ds = load_dataset(non_mlm_repo, split='train')
 
+    fingerprint = hashlib.sha256(
+        f"{mlm_ds._fingerprint}|{non_mlm_ds._fingerprint}|{PREPARATION_VERSION}".encode("utf-8")
+    ).hexdigest()[:16]
+    prepared_path = os.path.join(PREPARED_DATA_DIR, fingerprint)
+    if os.path.isdir(prepared_path):
+        logging.info(f"Loading prepared dataset from {prepared_path}")
+        return load_from_disk(prepared_path)
+
+    num_proc = min(PREPARE_NUM_PROC, max(1, (len(mlm_ds) + len(non_mlm_ds)) // PREPARE_BATCH_SIZE))
     logging.info("Adding ground truth labels...")
-    mlm_ds = mlm_ds.map(lambda x: {GROUND_TRUTH_LABEL: 1})
-    non_mlm_ds = non_mlm_ds.map(lambda x: {GROUND_TRUTH_LABEL: 0})
+    mlm_ds = mlm_ds.map(label_batch, batched=True, batch_size=PREPARE_BATCH_SIZE, fn_kwargs={"label": 1})
+    non_mlm_ds = non_mlm_ds.map(label_batch, batched=True, batch_size=PREPARE_BATCH_SIZE, fn_kwargs={"label": 0})
 
     logging.info("Combining datasets...")
     combined_ds = concatenate_datasets([mlm_ds, non_mlm_ds])
     logging.info(f"Combined dataset size: {len(combined_ds)} rows")
 
-    combined_ds = combined_ds.shuffle(seed=42)
+    combined_ds = combined_ds.shuffle(seed=42).flatten_indices()
 
+    logging.info(f"Standardizing rows with {num_proc} processes...")
+    combined_ds = combined_ds.map(
+        standardize_batch, batched=True, batch_size=PREPARE_BATCH_SIZE, num_proc=num_proc
+    )
+
+    combined_ds.save_to_disk(prepared_path)
+    logging.info(f"Saved prepared dataset to {prepared_path}")
     return combined_ds
 
 client = OpenAI(base_url=LMSTUDIO_BASE_URL, api_key=LMSTUDIO_API_KEY)
 
+def request_completion(model_identifier: str, messages: list[dict]) -> str:
+    """Returns the raw completion, from the cache or from the model.
+
+    Model calls go through the shared rate limiter and overload errors are
+    retried with backoff.
+    """
+    cache_key = CompletionCache.key(model_identifier, messages, SAMPLING_PARAMS)
+    cached = completion_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    for attempt in range(1, MAX_API_ATTEMPTS + 1):
+        rate_limiter.acquire()
+        try:
+            response = client.chat.completions.create(
+                model=model_identifier,
+                messages=messages,
+                stream=False,
+                **SAMPLING_PARAMS
+            )
+        except (RateLimitError, APIConnectionError) as e:
+            rate_limiter.backoff()
+            if attempt == MAX_API_ATTEMPTS:
+                raise
+            delay = random.uniform(0, min(30, 2 ** attempt))
+            logging.warning(f"Attempt {attempt} for model {model_identifier} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            rate_limiter.recover()
+            content = response.choices[0].message.content
+            completion_cache.set(cache_key, model_identifier, content)
+            return content
+
 def classify_mlm_content(standardized_data: dict, model_identifier: str) -> dict:
     """Sends standardized data to the specified LLM and parses the response."""
     result = {
@@ -144,11 +323,7 @@ def classify_mlm_content(standardized_data: dict, model_identifier: str) -> dict
     input_message = "\n".join(input_message_parts)
 
     try:
-        time.sleep(API_DELAY)
-
-        response = client.chat.completions.create(
-            model=model_identifier,
-            messages=[
+        raw_response_content = request_completion(model_identifier, [
             {"role": "system",
              "content": (
                  "You are an expert in identifying multi-level marketing (MLM) schemes. "
@@ -159,12 +334,7 @@ def classify_mlm_content(standardized_data: dict, model_identifier: str) -> dict
                  "- 'reasoning': An object containing detailed explanations for different factors contributing to your verdict."
              )},
             {"role": "user", "content": input_message}
-        ],
-        temperature=0.1,
-        stream=False
-        )
-
-        raw_response_content = response.choices[0].message.content
+        ])
         result["raw_response"] = raw_response_content
 
         try:
@@ -224,7 +394,7 @@ def classify_mlm_content(standardized_data: dict, model_identifier: str) -> dict
         result["error"] = f"API Connection Error: {e}"
     except RateLimitError as e:
         logging.error(f"LM Studio Rate Limit Error for model {model_identifier}: {e}")
-        result["error"] = f"Rate Limit Error: {e}. Consider increasing API_DELAY."
+        result["error"] = f"Rate Limit Error: {e}. Consider lowering REQUESTS_PER_SECOND."
     except APIError as e:
         logging.error(f"LM Studio API Error for model {model_identifier}: {e.status_code} - {e.response}")
         result["error"] = f"API Error {e.status_code}: {e}"
@@ -234,82 +404,151 @@ def classify_mlm_content(standardized_data: dict, model_identifier: str) -> dict
 
     return result
 
-def run_evaluation():
-    """Runs the full evaluation process."""
+def evaluate_row(model_id: str, i: int, row: dict, total_rows: int) -> dict:
+    """Classifies one dataset row with one model and returns its result row."""
+    post_link = row.get("Post link", f"Row_{i}")
+    logging.debug(f"Processing row {i+1}/{total_rows} for model {model_id} (Link: {post_link})")
+
+    standardized_data = json.loads(row[STANDARDIZED_COLUMN])
+
+    llm_result = classify_mlm_content(standardized_data, model_id)
+
+    predicted_label = -1 
+    raw_verdict = llm_result.get("verdict")
+    if llm_result.get("error") is None and raw_verdict:
+        if raw_verdict == 'Yes':
+            predicted_label = 1
+        elif raw_verdict == 'No':
+            predicted_label = 0
+
+    return {
+        "model_id": model_id,
+        "post_link": post_link,
+        GROUND_TRUTH_LABEL: row[GROUND_TRUTH_LABEL],
+        "predicted_label": predicted_label,
+        "raw_verdict": raw_verdict,
+        "certainty": llm_result.get("certainty"),
+        "reasoning": llm_result.get("reasoning", ""),
+        "error_info": llm_result.get("error"),
+        "raw_response": llm_result.get("raw_response")
+    }
+
+def load_completed(results_file: str) -> set[tuple[str, str]]:
+    """Returns the (model_id, post_link) pairs whose latest recorded result succeeded.
+
+    Pairs whose latest result is an error are left out, so a resumed run retries them.
+    The set is the one thing resuming has to hold in memory: one entry per finished pair.
+    """
+    completed = set()
+    for result_row in iter_results(results_file):
+        key = (result_row["model_id"], result_row["post_link"])
+        if result_row.get("error_info") is None:
+            completed.add(key)
+        else:
+            completed.discard(key)
+    return completed
+
+def truncate_torn_line(results_file: str):
+    """Cuts a partial final line left by an interrupted run, so appends start on a fresh line."""
+    if not os.path.exists(results_file):
+        return
+    with open(results_file, 'rb+') as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            logging.warning(f"Dropping incomplete final line of {results_file}")
+            file.truncate(position)
+
+def iter_results(results_file: str):
+    """Streams result rows from the JSONL results file, skipping a torn final line."""
+    if not os.path.exists(results_file):
+        return
+    with open(results_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping incomplete line in {results_file}")
+
+def run_evaluation(max_workers: int = MAX_WORKERS, results_file: str = OUTPUT_RESULTS_FILE) -> int:
+    """Runs the full evaluation process on a pool of worker threads.
+
+    Each result is appended to ``results_file`` as soon as it and every row
+    before it are done, so results stay in dataset order and an interrupted
+    run loses only the rows still in flight. Pairs already in the file are
+    skipped unless their result was an error, which makes the run resumable.
+    """
 
     combined_ds = load_and_prepare_data(MLM_DATASET, NON_MLM_DATASET)
 
-    all_results = []
+    truncate_torn_line(results_file)
+    completed = load_completed(results_file)
+    if completed:
+        logging.info(f"Resuming: {len(completed)} results already in {results_file}")
     total_rows = len(combined_ds)
     processed_count = 0
-
-    logging.info("Starting evaluation loop...")
-    for model_id in MODELS_TO_TEST:
-        logging.info(f"--- Evaluating Model: {model_id} ---")
-        model_start_time = time.time()
-        for i, row in enumerate(combined_ds):
-            processed_count += 1
-            post_link = row.get("Post link", f"Row_{i}")
-            logging.debug(f"Processing row {i+1}/{total_rows} for model {model_id} (Link: {post_link})")
-
-            standardized_data = standardize_data(row)
-
-            llm_result = classify_mlm_content(standardized_data, model_id)
-
-            predicted_label = -1 
-            raw_verdict = llm_result.get("verdict")
-            if llm_result.get("error") is None and raw_verdict:
-                if raw_verdict == 'Yes':
-                    predicted_label = 1
-                elif raw_verdict == 'No':
-                    predicted_label = 0
-
-
-            result_row = {
-                "model_id": model_id,
-                "post_link": post_link,
-                GROUND_TRUTH_LABEL: row[GROUND_TRUTH_LABEL],
-                "predicted_label": predicted_label,
-                "raw_verdict": raw_verdict,
-                "certainty": llm_result.get("certainty"),
-                "reasoning": llm_result.get("reasoning", ""),
-                "error_info": llm_result.get("error"),
-                "raw_response": llm_result.get("raw_response")
-            }
-            all_results.append(result_row)
-
-            if (i + 1) % 50 == 0:
-                logging.info(f"Model {model_id}: Processed {i + 1}/{total_rows} rows...")
-
-        model_end_time = time.time()
-        logging.info(f"--- Finished Model: {model_id} in {model_end_time - model_start_time:.2f} seconds ---")
-
-    logging.info(f"Finished processing all {processed_count} rows across {len(MODELS_TO_TEST)} models.")
-    return all_results
-
-
-def calculate_metrics(df_model: pd.DataFrame) -> dict:
-    """Calculates evaluation metrics for a single model's results."""
-    total_predictions = len(df_model)
-    errors = df_model['error_info'].notna() | (df_model['predicted_label'] == -1)
-    error_count = errors.sum()
+    window = max_workers * 4
+
+    logging.info(f"Starting evaluation loop with {max_workers} workers...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            open(results_file, 'a', encoding='utf-8') as output:
+
+        def write_result(result_row: dict):
+            output.write(json.dumps(result_row, ensure_ascii=False) + "\n")
+            output.flush()
+
+        for model_id in MODELS_TO_TEST:
+            logging.info(f"--- Evaluating Model: {model_id} ---")
+            model_start_time = time.time()
+            # Bounded look-ahead: memory stays flat however large the dataset is.
+            pending = deque()
+            for i, row in enumerate(combined_ds):
+                if (model_id, row.get("Post link", f"Row_{i}")) in completed:
+                    continue
+                pending.append(executor.submit(evaluate_row, model_id, i, row, total_rows))
+                if len(pending) >= window:
+                    write_result(pending.popleft().result())
+                    processed_count += 1
+                if (i + 1) % 50 == 0:
+                    logging.info(f"Model {model_id}: Processed {i + 1}/{total_rows} rows...")
+            while pending:
+                write_result(pending.popleft().result())
+                processed_count += 1
+
+            model_end_time = time.time()
+            logging.info(f"--- Finished Model: {model_id} in {model_end_time - model_start_time:.2f} seconds ---")
+
+    logging.info(f"Finished processing {processed_count} new rows across {len(MODELS_TO_TEST)} models.")
+    return processed_count
+
+
+def calculate_metrics(counts: dict) -> dict:
+    """Calculates evaluation metrics for a single model from its confusion counts."""
+    total_predictions = counts["total"]
+    valid = counts["tp"] + counts["tn"] + counts["fp"] + counts["fn"]
+    error_count = total_predictions - valid
     error_rate = (error_count / total_predictions) * 100 if total_predictions > 0 else 0
-    valid_df = df_model[~errors]
-    y_true = valid_df[GROUND_TRUTH_LABEL]
-    y_pred = valid_df['predicted_label']
 
-    if len(valid_df) == 0:
-        logging.warning(f"No valid predictions for model {df_model['model_id'].iloc[0]} to calculate metrics.")
+    if valid == 0:
+        logging.warning(f"No valid predictions for model {counts['model_id']} to calculate metrics.")
         return {
             "Error Rate (%)": error_rate,
             "Accuracy": 0, "Precision": 0, "Recall": 0, "F1-Score": 0,
             "Valid Predictions": 0, "Total Predictions": total_predictions
         }
 
-    accuracy = accuracy_score(y_true, y_pred)
-    precision = precision_score(y_true, y_pred, pos_label=1, zero_division=0)
-    recall = recall_score(y_true, y_pred, pos_label=1, zero_division=0)
-    f1 = f1_score(y_true, y_pred, pos_label=1, zero_division=0)
+    accuracy = (counts["tp"] + counts["tn"]) / valid
+    precision = counts["tp"] / (counts["tp"] + counts["fp"]) if counts["tp"] + counts["fp"] else 0
+    recall = counts["tp"] / (counts["tp"] + counts["fn"]) if counts["tp"] + counts["fn"] else 0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
 
     return {
         "Error Rate (%)": round(error_rate, 2),
@@ -317,35 +556,69 @@ def calculate_metrics(df_model: pd.DataFrame) -> dict:
         "Precision": round(precision, 4),
         "Recall": round(recall, 4),
         "F1-Score": round(f1, 4),
-        "Valid Predictions": len(valid_df),
+        "Valid Predictions": valid,
         "Total Predictions": total_predictions
     }
 
-def analyze_and_output_results(all_results: list):
-    """Analyzes results, saves detailed CSV, and prints summary metrics."""
-    if not all_results:
+def count_outcomes(results_file: str) -> dict:
+    """Reads the results file once, tallying confusion counts per model.
+
+    A resumed run appends a pair again only when its latest result was an error,
+    so only errored pairs are remembered: their retry replaces them in the counts
+    instead of being counted twice. Memory grows with the errors, not the rows.
+    """
+    counts = {}
+    errored = set()
+    for result_row in iter_results(results_file):
+        key = (result_row["model_id"], result_row["post_link"])
+        model_counts = counts.setdefault(result_row["model_id"], {
+            "model_id": result_row["model_id"], "total": 0, "tp": 0, "tn": 0, "fp": 0, "fn": 0
+        })
+        if key in errored:
+            errored.discard(key)
+        else:
+            model_counts["total"] += 1
+        if result_row.get("error_info") is not None:
+            errored.add(key)
+            continue
+        predicted, actual = result_row["predicted_label"], result_row[GROUND_TRUTH_LABEL]
+        if predicted == -1:
+            continue
+        outcome = ("t" if predicted == actual else "f") + ("p" if predicted == 1 else "n")
+        model_counts[outcome] += 1
+    return counts
+
+def export_csv(results_file: str, csv_file: str = OUTPUT_CSV_FILE):
+    """Converts the JSONL results to CSV chunk by chunk."""
+    header = True
+    with open(csv_file, 'w', encoding='utf-8', newline='') as output:
+        for chunk in pd.read_json(results_file, lines=True, chunksize=1000):
+            chunk.to_csv(output, index=False, header=header)
+            header = False
+
+def analyze_and_output_results(results_file: str = OUTPUT_RESULTS_FILE):
+    """Computes summary metrics from the results file, exports CSV, and prints the summary."""
+    if not os.path.exists(results_file):
         logging.warning("No results to analyze.")
         return
 
-    results_df = pd.DataFrame(all_results)
-
     try:
-        results_df.to_csv(OUTPUT_CSV_FILE, index=False, encoding='utf-8')
+        export_csv(results_file)
         logging.info(f"Detailed results saved to {OUTPUT_CSV_FILE}")
     except Exception as e:
         logging.error(f"Failed to save results to CSV: {e}")
 
+    counts = count_outcomes(results_file)
     summary_metrics = defaultdict(dict)
     print("\n--- Evaluation Summary ---")
     print("-" * 70)
 
     for model_id in MODELS_TO_TEST:
-        df_model = results_df[results_df['model_id'] == model_id]
-        if df_model.empty:
+        if model_id not in counts:
             logging.warning(f"No results found for model: {model_id}")
             continue
 
-        metrics = calculate_metrics(df_model)
+        metrics = calculate_metrics(counts[model_id])
         summary_metrics[model_id] = metrics
 
         print(f"Model: {model_id}")
@@ -358,7 +631,22 @@ def analyze_and_output_results(all_results: list):
         print(f"  - F1-Score (MLM):    {metrics['F1-Score']:.4f}")
         print("-" * 70)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate LLMs on the MLM post datasets.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Concurrent requests to LM Studio")
+    parser.add_argument("--results-file", default=OUTPUT_RESULTS_FILE, help="JSONL file results are appended to")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the completion cache")
+    parser.add_argument("--refresh-cache", action="store_true", help="Re-query the model and overwrite cached completions")
+    parser.add_argument("--clear-cache", action="store_true", help="Delete cached completions of the evaluated models first")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    evaluation_results = run_evaluation()
-    analyze_and_output_results(evaluation_results)
+    args = parse_args()
+    completion_cache = CompletionCache(COMPLETION_CACHE_FILE, enabled=not args.no_cache, refresh=args.refresh_cache)
+    if args.clear_cache:
+        for model_id in MODELS_TO_TEST:
+            logging.info(f"Cleared {completion_cache.clear(model_id)} cached completions for {model_id}")
+    run_evaluation(args.workers, args.results_file)
+    analyze_and_output_results(args.results_file)
+    logging.info(f"Completion cache: {completion_cache.stats()}")
     logging.info("Evaluation script finished.")
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from llm_evaluation import GROUND_TRUTH_LABEL, MLM_DATASET, NON_MLM_DATASET, STANDARDIZED_COLUMN, load_and_prepare_data
+
+# Share the feature hashing with the server so both sides see the same indices.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Server"))
+from src.LLM.Features import HASH_BUCKETS, hashed_features  # noqa: E402
+
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+OUTPUT_MODEL_FILE = os.path.join("..", "Server", "models", "preclassifier.json")
+REGULARIZATION = 1.0
+CALIBRATION_FRACTION = 0.2
+TEST_FRACTION = 0.2
+THRESHOLDS = [0.8, 0.9, 0.95, 0.97, 0.99]
+
+
+def build_matrix(rows: list[dict]) -> csr_matrix:
+    """Hashes standardized rows into a binary sparse feature matrix."""
+    indices, indptr = [], [0]
+    for row in rows:
+        indices.extend(sorted(hashed_features(row, HASH_BUCKETS)))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return csr_matrix((data, indices, indptr), shape=(len(rows), HASH_BUCKETS))
+
+
+def report_thresholds(probabilities: np.ndarray, labels: np.ndarray):
+    """Logs how many test posts each threshold answers without the LLM, and how accurately."""
+    predictions = (probabilities >= 0.5).astype(int)
+    confidence = np.maximum(probabilities, 1 - probabilities)
+    for threshold in THRESHOLDS:
+        answered = confidence >= threshold
+        coverage = answered.mean() if len(answered) else 0
+        accuracy = accuracy_score(labels[answered], predictions[answered]) if answered.any() else 0
+        logging.info(f"Threshold {threshold:.2f}: answers {coverage:.1%} of posts at {accuracy:.4f} accuracy")
+
+
+def train():
+    """Trains the hashed n-gram model, calibrates it and writes the server model file."""
+    combined_ds = load_and_prepare_data(MLM_DATASET, NON_MLM_DATASET)
+    rows = [json.loads(row) for row in combined_ds[STANDARDIZED_COLUMN]]
+    labels = np.array(combined_ds[GROUND_TRUTH_LABEL])
+
+    features = build_matrix(rows)
+    x_rest, x_test, y_rest, y_test = train_test_split(
+        features, labels, test_size=TEST_FRACTION, random_state=42, stratify=labels)
+    x_train, x_calib, y_train, y_calib = train_test_split(
+        x_rest, y_rest, test_size=CALIBRATION_FRACTION, random_state=42, stratify=y_rest)
+
+    logging.info(f"Training on {x_train.shape[0]} rows, calibrating on {x_calib.shape[0]}, testing on {x_test.shape[0]}")
+    model = LogisticRegression(C=REGULARIZATION, max_iter=1000)
+    model.fit(x_train, y_train)
+
+    # Platt scaling on held-out scores so the served probability is calibrated.
+    platt = LogisticRegression()
+    platt.fit(model.decision_function(x_calib).reshape(-1, 1), y_calib)
+    platt_a, platt_b = float(platt.coef_[0][0]), float(platt.intercept_[0])
+
+    test_scores = platt_a * model.decision_function(x_test) + platt_b
+    report_thresholds(1 / (1 + np.exp(-test_scores)), y_test)
+
+    weights = model.coef_[0]
+    nonzero = np.flatnonzero(weights)
+    exported = {
+        "buckets": HASH_BUCKETS,
+        "bias": float(model.intercept_[0]),
+        "platt_a": platt_a,
+        "platt_b": platt_b,
+        "weights": {str(index): round(float(weights[index]), 6) for index in nonzero},
+    }
+    os.makedirs(os.path.dirname(OUTPUT_MODEL_FILE), exist_ok=True)
+    with open(OUTPUT_MODEL_FILE, "w", encoding="utf-8") as file:
+        json.dump(exported, file)
+    logging.info(f"Saved pre-classifier with {len(nonzero)} weights to {OUTPUT_MODEL_FILE}")
+
+
+if __name__ == "__main__":
+    train()
@@ -0,0 +1,253 @@
+"""Benchmark POST /analyze/ against local Instagram and LM Studio stand-ins.
+
+Run with ``python -m benchmarks.run_benchmark`` from the ``Server`` directory.
+The real app is started with uvicorn and pointed at the stubs from
+``benchmarks.stubs``; results are written as JSON so runs can be compared
+across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STREAM_STAGES = ("post", "profile", "standardized", "first_token", "verdict")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(1000 * percentile(latencies, 50), 2),
+        "p95_ms": round(1000 * percentile(latencies, 95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 99), 2),
+        "max_ms": round(1000 * max(latencies), 2) if latencies else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=SERVER_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:g}s")
+
+
+async def run_phase(client: httpx.AsyncClient, base_url: str, shortcodes: List[str], concurrency: int,
+                    stream: bool) -> Dict[str, Any]:
+    """Send one request per shortcode with at most ``concurrency`` in flight."""
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {stage: [] for stage in STREAM_STAGES}
+    errors: List[str] = []
+    pending = iter(shortcodes)
+
+    async def analyze(shortcode: str) -> None:
+        body = {"url": f"https://www.instagram.com/p/{shortcode}/"}
+        start = time.perf_counter()
+        if not stream:
+            response = await client.post(f"{base_url}/analyze/", json=body)
+            if response.status_code != 200 or "error" in response.json():
+                errors.append(response.text[:200])
+                return
+            latencies.append(time.perf_counter() - start)
+            return
+        seen: Dict[str, float] = {}
+        async with client.stream("POST", f"{base_url}/analyze/stream", json=body) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("event: "):
+                    continue
+                event = line[len("event: "):]
+                if event == "error":
+                    errors.append(event)
+                    return
+                if event == "token":
+                    event = "first_token"
+                seen.setdefault(event, time.perf_counter() - start)
+        latencies.append(time.perf_counter() - start)
+        # Time spent in each stage, i.e. since the previous event arrived.
+        previous = 0.0
+        for stage in STREAM_STAGES:
+            if stage in seen:
+                stages[stage].append(seen[stage] - previous)
+                previous = seen[stage]
+
+    async def worker() -> None:
+        for shortcode in pending:
+            try:
+                await analyze(shortcode)
+            except httpx.HTTPError as e:
+                errors.append(str(e))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "requests": len(shortcodes),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(latencies),
+    }
+    if stream:
+        result["stages"] = {stage: summarize(values) for stage, values in stages.items()}
+    if errors:
+        result["sample_errors"] = errors[:5]
+    return result
+
+
+async def flood_background(client: httpx.AsyncClient, base_url: str, shortcodes: List[str]) -> int:
+    """Queue a background job per shortcode and return how many the server accepted."""
+    async def submit(shortcode: str) -> bool:
+        body = {"url": f"https://www.instagram.com/p/{shortcode}/", "priority": "background"}
+        response = await client.post(f"{base_url}/jobs", json=body)
+        return response.status_code in (200, 202)
+
+    accepted = 0
+    # Submitted in slices so the flood does not need a connection per job.
+    for index in range(0, len(shortcodes), 8):
+        accepted += sum(await asyncio.gather(*(submit(code) for code in shortcodes[index:index + 8])))
+    return accepted
+
+
+async def benchmark(args: argparse.Namespace, work_dir: str) -> Dict[str, Any]:
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    env = {
+        **os.environ,
+        "CHROMLM_INSTAGRAM_GRAPHQL_URL": f"http://127.0.0.1:{args.instagram_port}/graphql/query",
+        "CHROMLM_LMSTUDIO_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+        "CHROMLM_VERDICT_CACHE_PATH": os.path.join(work_dir, "verdict_cache.sqlite3"),
+        "CHROMLM_PRECLASSIFIER_PATH": os.path.join(work_dir, "no_preclassifier.json"),
+        "CHROMLM_INSTAGRAM_RATE": str(args.instagram_rate),
+        "CHROMLM_INSTAGRAM_BURST": str(args.instagram_rate),
+        "CHROMLM_LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+    }
+    stubs_log = open(os.path.join(work_dir, "stubs.log"), "w")
+    app_log = open(os.path.join(work_dir, "app.log"), "w")
+    processes = [
+        subprocess.Popen([
+            sys.executable, "-m", "benchmarks.stubs",
+            "--instagram-port", str(args.instagram_port), "--llm-port", str(args.llm_port),
+            "--instagram-latency", str(args.instagram_latency), "--llm-latency", str(args.llm_latency),
+            "--llm-token-latency", str(args.llm_token_latency), "--llm-slots", str(args.llm_slots), "--owners", str(args.owners),
+        ], cwd=SERVER_DIR, env=env, stdout=stubs_log, stderr=subprocess.STDOUT),
+        subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "src.Backend.backend:app",
+            "--host", "127.0.0.1", "--port", str(args.app_port), "--log-level", "warning",
+        ], cwd=SERVER_DIR, env=env, stdout=app_log, stderr=subprocess.STDOUT),
+    ]
+    try:
+        await wait_until_up(f"{base_url}/stats")
+        await wait_until_up(f"http://127.0.0.1:{args.llm_port}/docs")
+        run_id = uuid.uuid4().hex[:8]
+        phases = {}
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            for phase, stream in (("analyze", False), ("stream", True)):
+                # Unique shortcodes per phase keep every request a verdict-cache miss.
+                shortcodes = [f"B{run_id}{phase[0]}{i}" for i in range(args.requests)]
+                warmup = [f"W{run_id}{phase[0]}{i}" for i in range(args.warmup)]
+                if warmup:
+                    await run_phase(client, base_url, warmup, args.concurrency, stream)
+                phases[phase] = await run_phase(client, base_url, shortcodes, args.concurrency, stream)
+            if args.background:
+                # Interactive analyses sent while the job queue is busy with background work.
+                accepted = await flood_background(client, base_url, [f"G{run_id}{i}" for i in range(args.background)])
+                shortcodes = [f"B{run_id}l{i}" for i in range(args.requests)]
+                phases["loaded"] = await run_phase(client, base_url, shortcodes, args.concurrency, False)
+                phases["loaded"]["background_jobs"] = accepted
+            phases["server_stats"] = (await client.get(f"{base_url}/stats")).json()
+        return phases
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+        stubs_log.close()
+        app_log.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per phase")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent before each phase")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--background", type=int, default=0,
+                        help="Background jobs queued before a final phase of interactive requests (0 to skip it)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request in seconds")
+    parser.add_argument("--instagram-latency", type=float, default=0.15)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-token-latency", type=float, default=0.01)
+    parser.add_argument("--llm-slots", type=int, default=0,
+                        help="Completions the LLM stub serves at once (0 for no limit)")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="CHROMLM_LLM_MAX_CONCURRENCY for the app")
+    parser.add_argument("--instagram-rate", type=float, default=1000.0, help="CHROMLM_INSTAGRAM_RATE for the app")
+    parser.add_argument("--owners", type=int, default=1000000, help="Distinct accounts behind the replayed posts")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--instagram-port", type=int, default=8101)
+    parser.add_argument("--llm-port", type=int, default=8102)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON report")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="chromlm-bench-") as work_dir:
+        try:
+            phases = asyncio.run(benchmark(args, work_dir))
+        except Exception:
+            for name in ("app.log", "stubs.log"):
+                with open(os.path.join(work_dir, name), "r") as log_file:
+                    sys.stderr.write(f"--- {name} (tail) ---\n{log_file.read()[-4000:]}\n")
+            raise
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **phases,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    for phase in ("analyze", "stream", "loaded"):
+        if phase not in report:
+            continue
+        result = report[phase]
+        latency = result["latency"]
+        print(f"{phase:8} {result['requests_per_second']:>8} req/s  p50 {latency['p50_ms']} ms  "
+              f"p95 {latency['p95_ms']} ms  p99 {latency['p99_ms']} ms  errors {result['errors']}")
+    for stage, summary in report["stream"]["stages"].items():
+        print(f"  {stage:13} p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
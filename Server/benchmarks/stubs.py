@@ -0,0 +1,162 @@
+"""Local stand-ins for Instagram's GraphQL endpoint and LM Studio.
+
+Run with ``python -m benchmarks.stubs`` from the ``Server`` directory.
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import json
+import os
+import re
+import time
+import zlib
+from typing import Any, Dict
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.Instagram.PostScraperINSTAGRAM import INSTAGRAM_DOCUMENT_ID
+from src.Instagram.ProfileScraperINSTAGRAM import INSTAGRAM_PROFILE_DOCUMENT_ID
+
+# Combined classification prompts introduce each post with a line like this.
+COMBINED_POST_PATTERN = re.compile(r"^Post \d+:$", re.MULTILINE)
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+STUB_VERDICT = {
+    "verdict": "Yes",
+    "certainty": 92,
+    "reasoning": {
+        "recruitment": "The caption invites followers to DM for an opportunity and join a team.",
+        "income_claims": "Mentions financial freedom and working from home.",
+        "hashtags": "Uses #bossbabe, #sidehustle and #mompreneur."
+    }
+}
+
+
+def load_fixture(name: str) -> Dict[str, Any]:
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def instagram_app(latency: float, owners: int, related: int = 0) -> FastAPI:
+    """Replay recorded GraphQL responses for the post and profile documents.
+
+    Each post links to ``related`` made-up related posts and profiles, for exercising prefetching.
+    """
+    app = FastAPI()
+    post = load_fixture("post.json")
+    profile = load_fixture("profile.json")
+
+    @app.post("/graphql/query")
+    async def graphql(request: Request):
+        form = parse_qs((await request.body()).decode("utf-8"))
+        doc_id = form.get("doc_id", [""])[0]
+        variables = json.loads(form.get("variables", ["{}"])[0])
+        await asyncio.sleep(latency)
+        if doc_id == INSTAGRAM_DOCUMENT_ID:
+            shortcode = variables.get("shortcode", "")
+            response = copy.deepcopy(post)
+            media = response["data"]["xdt_shortcode_media"]
+            media["shortcode"] = shortcode
+            # Distinct captions keep every post a content cache miss, as unique posts would be.
+            for edge in media["edge_media_to_caption"]["edges"]:
+                edge["node"]["text"] += f" ({shortcode})"
+            # Spread posts over a fixed number of accounts so profile caching can be exercised.
+            media["owner"]["id"] = str(1000000000 + zlib.crc32(shortcode.encode("utf-8")) % owners)
+            media["edge_web_media_to_related_media"] = {"edges": [
+                {"node": {"shortcode": f"{shortcode}R{index}"}} for index in range(related)
+            ]}
+            media["edge_related_profiles"] = {"edges": [
+                {"node": {"id": str(1000000000 + zlib.crc32(f"{shortcode}R{index}".encode("utf-8")) % owners),
+                          "username": f"related_{index}"}} for index in range(related)
+            ]}
+            return JSONResponse(response)
+        if doc_id == INSTAGRAM_PROFILE_DOCUMENT_ID:
+            response = copy.deepcopy(profile)
+            response["data"]["user"]["id"] = response["data"]["user"]["pk"] = variables.get("id", "")
+            return JSONResponse(response)
+        return JSONResponse({"message": f"Unknown doc_id {doc_id}", "status": "fail"}, status_code=400)
+
+    return app
+
+
+def llm_app(latency: float, token_latency: float, slots: int = 0) -> FastAPI:
+    """Minimal OpenAI-compatible chat completion server.
+
+    ``slots`` caps the non-streaming completions served at once, like a model server
+    with a fixed number of parallel sequences; 0 serves them all concurrently.
+    """
+    app = FastAPI()
+    generating = asyncio.Semaphore(slots) if slots else None
+    content = json.dumps(STUB_VERDICT)
+    tokens = [content[i:i + 8] for i in range(0, len(content), 8)]
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "benchmark-stub")
+        created = int(time.time())
+        if not body.get("stream"):
+            user = next((m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user"), "")
+            posts = len(COMBINED_POST_PATTERN.findall(user))
+            answer = json.dumps({str(index): STUB_VERDICT for index in range(1, posts + 1)}) if posts else content
+            answer_tokens = max(1, posts) * len(tokens)
+            async with generating or contextlib.nullcontext():
+                await asyncio.sleep(latency + token_latency * answer_tokens)
+            return {
+                "id": "chatcmpl-benchmark",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": answer_tokens, "total_tokens": answer_tokens},
+            }
+
+        async def chunks():
+            for index, token in enumerate(tokens):
+                await asyncio.sleep(token_latency)
+                chunk = {
+                    "id": "chatcmpl-benchmark",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token},
+                                 "finish_reason": "stop" if index == len(tokens) - 1 else None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        await asyncio.sleep(latency)
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return app
+
+
+async def serve(args: argparse.Namespace) -> None:
+    servers = [
+        uvicorn.Server(uvicorn.Config(instagram_app(args.instagram_latency, args.owners, args.related),
+                                      host="127.0.0.1", port=args.instagram_port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(llm_app(args.llm_latency, args.llm_token_latency, args.llm_slots),
+                                      host="127.0.0.1", port=args.llm_port, log_level="warning")),
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instagram-port", type=int, default=8101)
+    parser.add_argument("--llm-port", type=int, default=8102)
+    parser.add_argument("--instagram-latency", type=float, default=0.15, help="Seconds per GraphQL response")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds before the first completion token")
+    parser.add_argument("--llm-token-latency", type=float, default=0.01, help="Seconds per streamed chunk")
+    parser.add_argument("--llm-slots", type=int, default=0,
+                        help="Non-streaming completions served at once (0 for no limit)")
+    parser.add_argument("--owners", type=int, default=1000000, help="Distinct accounts the replayed posts belong to")
+    parser.add_argument("--related", type=int, default=0, help="Related posts and profiles linked from each post")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_args()))
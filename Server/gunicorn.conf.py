@@ -0,0 +1,20 @@
+"""Production serving: ``gunicorn -c gunicorn.conf.py src.Backend.backend:app`` from the ``Server`` directory.
+
+The app is imported once in the master and forked into the workers. Workers share
+the Instagram rate budget, in-flight analyses and LLM slots through
+``CHROMLM_SHARED_STATE_PATH``, so adding workers adds CPU, not upstream traffic.
+"""
+import os
+
+bind = os.getenv("CHROMLM_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("CHROMLM_WORKERS", str(os.cpu_count() or 1)))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+# Seconds a stopping worker gets to finish in-flight requests (streams included) after SIGTERM.
+graceful_timeout = int(os.getenv("CHROMLM_GRACEFUL_TIMEOUT", "30"))
+# Workers run an event loop and heartbeat independently of request length, so this only catches hung workers.
+timeout = 60
+keepalive = 5
+
+# Must be set before the app is preloaded, since modules read it at import.
+os.environ.setdefault("CHROMLM_SHARED_STATE_PATH", "shared_state.sqlite3")
@@ -1,42 +1,57 @@
 import asyncio
+from typing import Callable, List, Optional
+
 from loguru import logger as log
-from src.Instagram.PostScraperINSTAGRAM import run as ig_post_run
+from src.Cache.ProfileCache import profile_cache
+from src.Concurrency.Retry import Deadline
+from src.Concurrency.SingleFlight import SingleFlight
+from src.Instagram.HttpClient import INSTAGRAM_DEADLINE, scrape_policy
+from src.Instagram.PostScraperINSTAGRAM import extract_shortcode, run as ig_post_run
 from src.Instagram.ProfileScraperINSTAGRAM import run as ig_profile_run
+from src.Instagram.Records import Post
+from src.Observability.Metrics import stage_timer
+
+post_flight = SingleFlight("ig_post_run")
+profile_flight = SingleFlight("ig_profile_run")
+# Called with every post scraped for an analysis, e.g. to prefetch what it links to.
+post_observers: List[Callable[[Post], None]] = []
+
+
+async def fetch_post(post_url: str, deadline: Optional[Deadline] = None):
+    shortcode = extract_shortcode(post_url)
+    with stage_timer("post_scrape"):
+        post = await post_flight.do(shortcode, lambda: scrape_policy.call(lambda: ig_post_run(post_url), deadline))
+    for observer in post_observers:
+        observer(post)
+    return post
+
+
+async def fetch_profile(pk: str, deadline: Optional[Deadline] = None):
+    with stage_timer("profile_scrape"):
+        return await profile_flight.do(pk, lambda: scrape_policy.call(lambda: ig_profile_run(pk), deadline))
 
-MAX_RETRIES = 5
+
+async def get_profile(pk: str, deadline: Optional[Deadline] = None):
+    # Background refreshes get a fresh deadline rather than the expired one of the request that triggered them.
+    return await profile_cache.get_or_fetch(pk, lambda: fetch_profile(pk, deadline), lambda: fetch_profile(pk))
 
 
 async def aggregate_data(post_url: str):
     log.info("Running Instagram data aggregator.")
-    # Step 1: Fetch post data with retry logic
-    post_data = None
-    for attempt in range(MAX_RETRIES):
-        post_data = await ig_post_run(post_url)
-        if post_data:
-            break
-        print(f"Retry {attempt + 1} for fetching post data...")
-
-    if not post_data:
-        print("Failed to fetch post data after retries.")
-        return
+    # Post and profile scrapes, including their retries, share one deadline.
+    deadline = Deadline(INSTAGRAM_DEADLINE)
+
+    # Step 1: Fetch post data
+    post_data = await fetch_post(post_url, deadline)
 
     # Extract the 'pk' for profile scraping
-    pk = post_data.get("pk")
+    pk = post_data.pk
     if not pk:
         print("Failed to extract pk from post data.")
         return
 
-    # Step 2: Fetch profile data using 'pk' with retry logic
-    profile_data = None
-    for attempt in range(MAX_RETRIES):
-        profile_data = await ig_profile_run(pk)
-        if profile_data:
-            break
-        print(f"Retry {attempt + 1} for fetching profile data...")
-
-    if not profile_data:
-        print("Failed to fetch profile data after retries.")
-        return
+    # Step 2: Fetch profile data using 'pk', served from the profile cache when possible
+    profile_data = await get_profile(pk, deadline)
 
     # Combine all data into one dictionary
     aggregated_data = {
@@ -45,4 +60,4 @@ async def aggregate_data(post_url: str):
     }
 
     log.success("Successfully aggregated scraped Instagram data.")
-    return aggregated_data
\ No newline at end of file
+    return aggregated_data
@@ -1,27 +1,445 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Set, Tuple
+
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from src.LLM.LMStudioInterface import analyze_post
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from loguru import logger as log
+from pydantic import BaseModel, Field
+from src.Cache.ContentCache import content_cache
+from src.Cache.ProfileCache import profile_cache
+from src.Cache.VerdictCache import verdict_cache
+from src.Concurrency.SharedState import SharedFlight, shared_state
+from src.Instagram.HttpClient import close_http_client, get_http_client, instagram_breaker, instagram_limiter, scrape_policy
+from src.Instagram.PostScraperINSTAGRAM import canonical_post_url, extract_shortcode, is_post_reference
+from src.Jobs.JobQueue import (
+    BACKGROUND, DONE, FAILED, INTERACTIVE, PREFETCH, QUEUED, Job, JobQueue, QueueFull, job_priority
+)
+from src.Jobs.Prefetcher import Prefetcher
+from src.Aggregators.InstagramAggregator import get_profile, post_flight, post_observers, profile_flight
+from src.LLM.PreClassifier import pre_classifier
+from src.LLM.LMStudioInterface import (
+    analysis_flight, analyze_post, close_client, content_flight, llm_dispatcher, llm_governor, prompt_counters,
+    stream_analysis
+)
+from src.Observability.Logging import configure_logging
+from src.Observability.Metrics import http_request_seconds, registry, request_id
+
+BATCH_MAX_ITEMS = int(os.getenv("CHROMLM_BATCH_MAX_ITEMS", "1000"))
+BATCH_SCRAPE_CONCURRENCY = int(os.getenv("CHROMLM_BATCH_SCRAPE_CONCURRENCY", "4"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("CHROMLM_BATCH_LLM_CONCURRENCY", "1"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("CHROMLM_BATCH_MAX_CONCURRENCY", "16"))
+# Longest a single job poll or push-channel wait may block before it is answered.
+JOB_MAX_WAIT = float(os.getenv("CHROMLM_JOB_MAX_WAIT", "30"))
+
+# Strong references to background revalidation tasks so they are not
+# garbage collected mid-flight.
+_revalidations: Set[asyncio.Task] = set()
+# Analyses in flight anywhere on the host; a worker that loses the race picks the
+# verdict up from the shared verdict cache instead of scraping and classifying again.
+verdict_flight = SharedFlight("verdict", shared_state)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    get_http_client()
+    job_queue.start()
+    prefetcher.start()
+    yield
+    await prefetcher.stop()
+    await job_queue.stop()
+    for task in list(_revalidations):
+        task.cancel()
+    profile_cache.cancel_refreshes()
+    await close_client()
+    await close_http_client()
+    verdict_cache.close()
+    content_cache.close()
+    if shared_state is not None:
+        shared_state.close()
+    await log.complete()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  
+    allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["*"],  
-    allow_headers=["*"],  
+    allow_methods=["*"],
+    allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def track_request(request: Request, call_next):
+    """Tag the request with an ID (the caller's ``X-Request-ID`` if given) and time it."""
+    rid = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token = request_id.set(rid)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_id.reset(token)
+    # Labelled by route template so per-post URLs don't create a series each.
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    http_request_seconds.observe(time.perf_counter() - start, path=path, method=request.method)
+    response.headers["X-Request-ID"] = rid
+    return response
+
+
 class PostURL(BaseModel):
     url: str
+    force_refresh: bool = False
+    max_age: Optional[float] = None
+    stale_while_revalidate: bool = False
+    # "interactive" for analyses a user asked for, "background" for automatic ones.
+    priority: Literal["interactive", "background"] = INTERACTIVE
+
+
+class BatchRequest(BaseModel):
+    urls: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    scrape_concurrency: int = Field(BATCH_SCRAPE_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY)
+    llm_concurrency: int = Field(BATCH_LLM_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY)
+    force_refresh: bool = False
+    max_age: Optional[float] = None
+
+
+async def refresh_verdict(url: str, shortcode: str, scrape_limit: Optional[asyncio.Semaphore] = None,
+                          llm_limit: Optional[asyncio.Semaphore] = None, force: bool = False) -> Dict[str, Any]:
+    """Analyze the post and cache the verdict; ``force`` re-asks the model instead of reusing a content verdict."""
+    since = time.time()
+
+    async def analyze() -> Dict[str, Any]:
+        result = await analyze_post(url, scrape_limit, llm_limit, force)
+        await verdict_cache.set(shortcode, result)
+        return result
+
+    return await verdict_flight.do(shortcode, analyze, lambda: verdict_cache.get_stored_since(shortcode, since))
+
+
+def schedule_revalidation(url: str, shortcode: str) -> None:
+    if any(task.get_name() == f"revalidate:{shortcode}" for task in _revalidations):
+        return
+    log.info("Revalidating stale verdict for {} in the background", shortcode)
+    task = asyncio.create_task(refresh_verdict(url, shortcode, force=True), name=f"revalidate:{shortcode}")
+    _revalidations.add(task)
+    task.add_done_callback(_revalidations.discard)
+
+
+async def cached_verdict(url: str, shortcode: str, force_refresh: bool = False, max_age: Optional[float] = None,
+                         stale_while_revalidate: bool = False) -> Optional[Tuple[Dict[str, Any], str, float]]:
+    """Return ``(verdict, cache_status, age)`` if the cache can answer under the request's options."""
+    if not force_refresh:
+        entry = await verdict_cache.get(shortcode)
+        if entry is not None:
+            fresh_for = verdict_cache.ttl if max_age is None else min(max_age, verdict_cache.ttl)
+            if entry.age <= fresh_for:
+                verdict_cache.record_hit(entry)
+                return entry.verdict, "HIT", entry.age
+            if stale_while_revalidate:
+                verdict_cache.record_hit(entry, stale=True)
+                schedule_revalidation(url, shortcode)
+                return entry.verdict, "STALE", entry.age
+    verdict_cache.record_miss()
+    return None
+
+
+async def get_verdict(url: str, force_refresh: bool = False, max_age: Optional[float] = None,
+                      stale_while_revalidate: bool = False, scrape_limit: Optional[asyncio.Semaphore] = None,
+                      llm_limit: Optional[asyncio.Semaphore] = None) -> Tuple[Dict[str, Any], str, float]:
+    """Return ``(verdict, cache_status, age)`` honouring the request's cache-control options."""
+    shortcode = extract_shortcode(url)
+    cached = await cached_verdict(url, shortcode, force_refresh, max_age, stale_while_revalidate)
+    if cached is not None:
+        return cached
+    return await refresh_verdict(url, shortcode, scrape_limit, llm_limit, force_refresh), "MISS", 0.0
+
+
+async def run_job(job: Job) -> Dict[str, Any]:
+    # Log lines of the job carry the ID of the request that queued it.
+    token = request_id.set(job.request_id)
+    try:
+        result = await refresh_verdict(job.url, job.shortcode, force=job.options.get("force_refresh", False))
+    finally:
+        request_id.reset(token)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+
+job_queue = JobQueue(run_job, shared=shared_state)
+
+
+async def prefetch_post(shortcode: str) -> bool:
+    """Analyze a related post at the lowest priority unless a fresh verdict is already cached."""
+    entry = await verdict_cache.get(shortcode)
+    if entry is not None and entry.age <= verdict_cache.ttl:
+        return False
+    job = await job_queue.submit(canonical_post_url(shortcode), shortcode, PREFETCH)
+    await job.finished.wait()
+    if job.status == FAILED:
+        raise RuntimeError(job.error)
+    return True
+
+
+async def prefetch_profile(pk: str) -> bool:
+    if profile_cache.get(pk) is not None:
+        return False
+    await get_profile(pk)
+    return True
+
+
+def prefetch_suspended() -> Optional[str]:
+    """Why prefetching has to wait, or ``None`` while Instagram and the workers have capacity to spare."""
+    if job_queue.queued() or job_queue.running():
+        return "analyses are queued or running"
+    if instagram_breaker.state != "closed":
+        return "the Instagram circuit breaker is open"
+    if not instagram_limiter.has_headroom():
+        return "the Instagram rate limit has no headroom"
+    return None
+
+
+prefetcher = Prefetcher(prefetch_post, prefetch_profile, prefetch_suspended)
+post_observers.append(prefetcher.offer)
+
+
+def queue_full_response(e: QueueFull) -> JSONResponse:
+    log.warning("Shedding {} analysis: {}", e.priority, str(e))
+    return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": str(e.retry_after)})
+
+
+def post_reference(url_or_shortcode: str) -> Tuple[str, str]:
+    """Return the canonical URL and shortcode of a post, rejecting anything else with 400."""
+    if not is_post_reference(url_or_shortcode):
+        raise HTTPException(status_code=400, detail="Not an Instagram post URL or shortcode")
+    shortcode = extract_shortcode(url_or_shortcode)
+    return canonical_post_url(shortcode), shortcode
+
+
+def job_options(post_url: PostURL) -> Dict[str, Any]:
+    # A forced refresh must reach the model, so the job skips the content cache too.
+    return {"force_refresh": True} if post_url.force_refresh else {}
+
+
+async def submit_job(post_url: PostURL) -> Job:
+    """Answer from the verdict cache when possible, otherwise queue the analysis."""
+    url, shortcode = post_reference(post_url.url)
+    cached = await cached_verdict(url, shortcode, post_url.force_refresh, post_url.max_age,
+                                  post_url.stale_while_revalidate)
+    if cached is not None:
+        verdict, cache_status, _ = cached
+        return await job_queue.complete(url, shortcode, post_url.priority, verdict, cache_status)
+    return await job_queue.submit(url, shortcode, post_url.priority, job_options(post_url))
+
 
 @app.post("/analyze/")
-async def analyze_social_post(post_url: PostURL):
+async def analyze_social_post(post_url: PostURL, response: Response):
+    """Synchronous analysis: a cache hit is answered directly, a miss waits for its queued job."""
+    url, shortcode = post_reference(post_url.url)
+    cached = await cached_verdict(url, shortcode, post_url.force_refresh, post_url.max_age,
+                                  post_url.stale_while_revalidate)
+    if cached is not None:
+        result, cache_status, age = cached
+    else:
+        try:
+            job = await job_queue.submit(url, shortcode, post_url.priority, job_options(post_url))
+        except QueueFull as e:
+            return queue_full_response(e)
+        await job.finished.wait()
+        if job.status == FAILED:
+            return {"error": job.error}
+        result, cache_status, age = job.result, "MISS", 0.0
+    response.headers["X-Cache"] = cache_status
+    response.headers["Age"] = str(int(age))
+    return result
+
+
+@app.post("/jobs")
+async def create_job(post_url: PostURL):
     try:
-        result = await analyze_post(post_url.url)
-        return result
+        job = await submit_job(post_url)
+    except QueueFull as e:
+        return queue_full_response(e)
+    snapshot = await job_queue.get(job.id)
+    return JSONResponse(snapshot, status_code=200 if job.status == DONE else 202,
+                        headers={"Location": f"/jobs/{job.id}"})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Poll a job; ``wait`` long-polls up to that many seconds for it to finish."""
+    if wait > 0:
+        snapshot = await job_queue.wait(job_id, min(wait, JOB_MAX_WAIT))
+    else:
+        snapshot = await job_queue.get(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return snapshot
+
+
+async def stream_job_events(job_id: str, request: Request) -> AsyncIterator[str]:
+    snapshot = await job_queue.get(job_id)
+    while snapshot is not None:
+        yield sse_event(snapshot["status"], snapshot)
+        if snapshot["status"] in (DONE, FAILED):
+            return
+        status = snapshot["status"]
+        while snapshot is not None and snapshot["status"] == status:
+            if await request.is_disconnected():
+                return
+            snapshot = await job_queue.wait(job_id, JOB_MAX_WAIT, started=status == QUEUED)
+            if snapshot is not None and snapshot["status"] == status:
+                # Comment line that keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, request: Request):
+    """Push channel for a job: one SSE event per status change, ending with ``done`` or ``failed``."""
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return StreamingResponse(
+        stream_job_events(job_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_post_analysis(post_url: PostURL, request: Request) -> AsyncIterator[str]:
+    """Yield SSE events for each pipeline stage, then LLM tokens and the parsed verdict."""
+    shortcode = extract_shortcode(post_url.url)
+    if not post_url.force_refresh:
+        entry = await verdict_cache.get(shortcode)
+        fresh_for = verdict_cache.ttl if post_url.max_age is None else min(post_url.max_age, verdict_cache.ttl)
+        if entry is not None and entry.age <= fresh_for:
+            verdict_cache.record_hit(entry)
+            yield sse_event("verdict", {"result": entry.verdict, "cache": "HIT", "age": int(entry.age)})
+            return
+    verdict_cache.record_miss()
+
+    stages = stream_analysis(canonical_post_url(post_url.url), post_url.force_refresh)
+    try:
+        async for event, payload in stages:
+            if await request.is_disconnected():
+                log.info("Client disconnected from stream for {}, cancelling analysis", shortcode)
+                return
+            if event == "verdict":
+                await verdict_cache.set(shortcode, payload)
+                payload = {"result": payload, "cache": "MISS", "age": 0}
+            yield sse_event(event, payload)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        log.error("Streaming analysis of {} failed: {}", shortcode, str(e))
+        yield sse_event("error", {"error": str(e)})
+    finally:
+        await stages.aclose()
+
+
+@app.post("/analyze/stream")
+async def analyze_social_post_stream(post_url: PostURL, request: Request):
+    post_reference(post_url.url)
+    return StreamingResponse(
+        stream_post_analysis(post_url, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def stream_batch(batch: BatchRequest) -> AsyncIterator[str]:
+    """Analyze a batch with bounded concurrency, yielding NDJSON lines in completion order."""
+    scrape_limit = asyncio.Semaphore(batch.scrape_concurrency)
+    llm_limit = asyncio.Semaphore(batch.llm_concurrency)
+    pending = iter(enumerate(batch.urls))
+    results: asyncio.Queue = asyncio.Queue(maxsize=batch.scrape_concurrency + batch.llm_concurrency)
+
+    async def analyze_item(index: int, item: str) -> Dict[str, Any]:
+        line: Dict[str, Any] = {"index": index, "input": item}
+        try:
+            if not is_post_reference(item):
+                raise ValueError("Not an Instagram post URL or shortcode")
+            line["shortcode"] = extract_shortcode(item)
+            result, cache_status, _ = await get_verdict(
+                canonical_post_url(item),
+                force_refresh=batch.force_refresh,
+                max_age=batch.max_age,
+                scrape_limit=scrape_limit,
+                llm_limit=llm_limit
+            )
+            line["cache"] = cache_status
+            if "error" in result:
+                line["error"] = result["error"]
+            else:
+                line["result"] = result
+        except Exception as e:
+            log.error("Batch item {} failed: {}", item, str(e))
+            line["error"] = str(e)
+        return line
+
+    async def worker() -> None:
+        # Bulk work, so it must not take the LLM slots held back for interactive requests.
+        job_priority.set(lambda: BACKGROUND)
+        # Workers pull items lazily so only a bounded number are in flight at once.
+        for index, item in pending:
+            await results.put(await analyze_item(index, item))
+
+    worker_count = min(len(batch.urls), batch.scrape_concurrency + batch.llm_concurrency)
+    workers = [asyncio.create_task(worker()) for _ in range(worker_count)]
+    try:
+        for _ in range(len(batch.urls)):
+            yield json.dumps(await results.get()) + "\n"
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(batch: BatchRequest):
+    log.info("Received batch of {} posts for analysis", len(batch.urls))
+    return StreamingResponse(stream_batch(batch), media_type="application/x-ndjson")
+
+
+def collect_stats() -> Dict[str, Any]:
+    return {
+        "verdict_cache": verdict_cache.stats(),
+        "content_cache": content_cache.stats(),
+        "jobs": job_queue.stats(),
+        "prefetch": prefetcher.stats(),
+        "profile_cache": profile_cache.stats(),
+        "single_flight": {
+            flight.name: flight.stats()
+            for flight in (verdict_flight, analysis_flight, content_flight, post_flight, profile_flight)
+        },
+        "instagram_rate_limit": instagram_limiter.stats(),
+        "instagram_circuit": instagram_breaker.stats(),
+        "instagram_retries": scrape_policy.stats(),
+        "prompt": prompt_counters,
+        "llm_batching": llm_dispatcher.stats(),
+        "llm_governor": llm_governor.stats(),
+        "pre_classifier": pre_classifier.stats(),
+    }
+
+
+registry.add_collector(collect_stats)
+
+
+@app.get("/stats")
+async def get_stats():
+    return collect_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
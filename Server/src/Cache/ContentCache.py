@@ -0,0 +1,56 @@
+import os
+from typing import Any, Dict, Optional
+
+from src.Cache.VerdictCache import VERDICT_CACHE_PATH
+from src.Cache.VerdictStore import VerdictStore
+
+CONTENT_CACHE_MEMORY_SIZE = int(os.getenv("CHROMLM_CONTENT_CACHE_MEMORY_SIZE", "2048"))
+# Seconds a model verdict is reused for identical prompt content; 0 disables reuse.
+CONTENT_CACHE_TTL = float(os.getenv("CHROMLM_CONTENT_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+
+class ContentCache:
+    """Model verdicts keyed by a hash of the prompt content rather than by post.
+
+    Reposts, templated captions and re-analyses of unchanged posts produce the same
+    prompt, so they can reuse an earlier verdict without calling the model. Entries
+    live in an in-process LRU in front of a table in the verdict cache's SQLite file,
+    which every worker shares.
+    """
+
+    def __init__(self, path: str = VERDICT_CACHE_PATH, memory_size: int = CONTENT_CACHE_MEMORY_SIZE,
+                 ttl: float = CONTENT_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.store = VerdictStore(path, "content_verdicts", "content_key", memory_size, ttl)
+        self.counters = {"hits": 0, "misses": 0, "writes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        item = await self.store.get(key)
+        self.counters["hits" if item is not None else "misses"] += 1
+        return None if item is None else item[0]
+
+    async def set(self, key: str, verdict: Dict[str, Any]) -> None:
+        if self.enabled and await self.store.set(key, verdict):
+            self.counters["writes"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            "memory": self.store.memory.stats(),
+            "ttl": self.ttl,
+        }
+
+    def close(self) -> None:
+        self.store.close()
+
+
+content_cache = ContentCache()
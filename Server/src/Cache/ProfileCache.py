@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from loguru import logger as log
+from src.Cache.LRUCache import LRUCache
+from src.Instagram.Records import Profile
+
+PROFILE_CACHE_SIZE = int(os.getenv("CHROMLM_PROFILE_CACHE_SIZE", "4096"))
+# Seconds a parsed profile is served from memory.
+PROFILE_CACHE_TTL = float(os.getenv("CHROMLM_PROFILE_CACHE_TTL", str(60 * 60)))
+# Fraction of the TTL after which a hit also triggers a background refresh.
+PROFILE_CACHE_REFRESH_AHEAD = float(os.getenv("CHROMLM_PROFILE_CACHE_REFRESH_AHEAD", "0.8"))
+
+
+class ProfileCache:
+    """In-process cache of parsed ``Profile`` records keyed by owner pk, refreshed ahead of expiry."""
+
+    def __init__(self, max_size: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL,
+                 refresh_ahead: float = PROFILE_CACHE_REFRESH_AHEAD):
+        self.memory = LRUCache(max_size, ttl)
+        self.refresh_after = ttl * refresh_ahead
+        self.counters = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0}
+        # Strong references so background refreshes are not garbage collected mid-flight.
+        self._refreshes: Set[asyncio.Task] = set()
+
+    def get(self, pk: Hashable) -> Optional[Profile]:
+        item = self.memory.get(pk)
+        return None if item is None else item[0]
+
+    def set(self, pk: Hashable, profile: Optional[Profile]) -> None:
+        if profile:
+            self.memory.set(pk, profile)
+
+    async def get_or_fetch(self, pk: Hashable, fetch: Callable[[], Awaitable[Optional[Profile]]],
+                           refresh: Optional[Callable[[], Awaitable[Optional[Profile]]]] = None
+                           ) -> Optional[Profile]:
+        """Return the cached profile or ``fetch`` it; ``refresh`` (default ``fetch``) runs in the background."""
+        item = self.memory.get(pk)
+        if item is not None:
+            self.counters["hits"] += 1
+            if time.time() - item[1] > self.refresh_after:
+                self._schedule_refresh(pk, refresh or fetch)
+            return item[0]
+        self.counters["misses"] += 1
+        profile = await fetch()
+        self.set(pk, profile)
+        return profile
+
+    def _schedule_refresh(self, pk: Hashable, fetch: Callable[[], Awaitable[Optional[Profile]]]) -> None:
+        name = f"refresh-profile:{pk}"
+        if any(task.get_name() == name for task in self._refreshes):
+            return
+        log.debug("Refreshing cached profile {} ahead of expiry", pk)
+        task = asyncio.create_task(self._refresh(pk, fetch), name=name)
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def _refresh(self, pk: Hashable, fetch: Callable[[], Awaitable[Optional[Profile]]]) -> None:
+        self.counters["refreshes"] += 1
+        try:
+            profile = await fetch()
+        except Exception as e:
+            profile = None
+            log.warning("Background refresh of profile {} failed: {}", pk, str(e))
+        if profile:
+            self.set(pk, profile)
+        else:
+            self.counters["refresh_failures"] += 1
+
+    def cancel_refreshes(self) -> None:
+        for task in list(self._refreshes):
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            "refreshing": len(self._refreshes),
+            "memory": self.memory.stats(),
+            "refresh_after": self.refresh_after,
+        }
+
+
+profile_cache = ProfileCache()
@@ -0,0 +1,83 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from src.Cache.VerdictStore import VerdictStore
+
+VERDICT_CACHE_PATH = os.getenv("CHROMLM_VERDICT_CACHE_PATH", "verdict_cache.sqlite3")
+VERDICT_CACHE_MEMORY_SIZE = int(os.getenv("CHROMLM_VERDICT_CACHE_MEMORY_SIZE", "2048"))
+# Seconds a verdict is considered fresh.
+VERDICT_CACHE_TTL = float(os.getenv("CHROMLM_VERDICT_CACHE_TTL", str(6 * 60 * 60)))
+# Extra seconds past the TTL during which a stale verdict may still be served
+# while it is being revalidated in the background.
+VERDICT_CACHE_STALE_TTL = float(os.getenv("CHROMLM_VERDICT_CACHE_STALE_TTL", str(24 * 60 * 60)))
+
+
+@dataclass
+class CachedVerdict:
+    verdict: Dict[str, Any]
+    stored_at: float
+    tier: str
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.stored_at)
+
+
+class VerdictCache:
+    """Two-tier verdict cache keyed by shortcode: an in-process LRU in front of a SQLite table."""
+
+    def __init__(self, path: str = VERDICT_CACHE_PATH, memory_size: int = VERDICT_CACHE_MEMORY_SIZE,
+                 ttl: float = VERDICT_CACHE_TTL, stale_ttl: float = VERDICT_CACHE_STALE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.store = VerdictStore(path, "verdicts", "shortcode", memory_size, ttl + stale_ttl)
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "writes": 0}
+
+    async def get(self, shortcode: str) -> Optional[CachedVerdict]:
+        """Look up a verdict regardless of freshness; callers decide what age to accept."""
+        item = await self.store.get(shortcode)
+        return None if item is None else CachedVerdict(*item)
+
+    async def get_stored_since(self, shortcode: str, since: float) -> Optional[Dict[str, Any]]:
+        """Return a verdict written at or after ``since``, e.g. by another worker; checks disk past the memory tier."""
+        item = self.store.memory.get(shortcode)
+        if item is not None and item[1] >= since:
+            return item[0]
+        item = await self.store.read(shortcode)
+        if item is None or item[1] < since:
+            return None
+        return item[0]
+
+    async def set(self, shortcode: str, verdict: Dict[str, Any]) -> None:
+        if await self.store.set(shortcode, verdict):
+            self.counters["writes"] += 1
+
+    async def purge(self) -> int:
+        return await self.store.purge()
+
+    def record_hit(self, entry: CachedVerdict, stale: bool = False) -> None:
+        self.counters["stale_hits" if stale else "hits"] += 1
+        self.counters[f"{entry.tier}_hits"] += 1
+
+    def record_miss(self) -> None:
+        self.counters["misses"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["hits"] + self.counters["stale_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory": self.store.memory.stats(),
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+        }
+
+    def close(self) -> None:
+        self.store.close()
+
+
+verdict_cache = VerdictCache()
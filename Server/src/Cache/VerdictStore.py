@@ -0,0 +1,102 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger as log
+from src.Cache.LRUCache import LRUCache
+
+Verdict = Dict[str, Any]
+
+
+def is_cacheable(verdict: Verdict) -> bool:
+    return bool(verdict) and "error" not in verdict and verdict.get("verdict") != "Error"
+
+
+class VerdictStore:
+    """Verdicts keyed by a string: an in-process LRU in front of one table of a SQLite file.
+
+    The verdict and content caches each keep a table in the same file, so every worker
+    sees the others' writes. Entries older than ``ttl`` are neither returned nor kept
+    in memory; freshness policy within that window is up to the caller.
+    """
+
+    def __init__(self, path: str, table: str, key_column: str, memory_size: int, ttl: float):
+        self.path = path
+        self.table = table
+        self.key_column = key_column
+        self.ttl = ttl
+        self.memory = LRUCache(memory_size, ttl)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            log.info("Opening {} table at {}", self.table, self.path)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                f"{self.key_column} TEXT PRIMARY KEY, verdict TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def _disk_get(self, key: str) -> Optional[Tuple[Verdict, float]]:
+        with self._lock:
+            row = self._connection().execute(
+                f"SELECT verdict, stored_at FROM {self.table} WHERE {self.key_column} = ? AND stored_at >= ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def _disk_set(self, key: str, verdict: Verdict, stored_at: float) -> None:
+        with self._lock:
+            self._connection().execute(
+                f"INSERT OR REPLACE INTO {self.table} ({self.key_column}, verdict, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(verdict), stored_at)
+            )
+
+    def _disk_purge(self) -> int:
+        with self._lock:
+            cursor = self._connection().execute(
+                f"DELETE FROM {self.table} WHERE stored_at < ?", (time.time() - self.ttl,)
+            )
+        return cursor.rowcount
+
+    async def read(self, key: str) -> Optional[Tuple[Verdict, float]]:
+        """Return ``(verdict, stored_at)`` from disk, past the memory tier, and remember it in memory."""
+        item = await asyncio.to_thread(self._disk_get, key)
+        if item is not None:
+            self.memory.set(key, item[0], item[1])
+        return item
+
+    async def get(self, key: str) -> Optional[Tuple[Verdict, float, str]]:
+        """Return ``(verdict, stored_at, tier)``, where tier says whether memory or disk answered."""
+        item = self.memory.get(key)
+        if item is not None:
+            return item[0], item[1], "memory"
+        item = await self.read(key)
+        return None if item is None else (item[0], item[1], "disk")
+
+    async def set(self, key: str, verdict: Verdict) -> bool:
+        """Store a verdict in both tiers; returns ``False`` for errors, which are never cached."""
+        if not is_cacheable(verdict):
+            return False
+        stored_at = time.time()
+        self.memory.set(key, verdict, stored_at)
+        try:
+            await asyncio.to_thread(self._disk_set, key, verdict, stored_at)
+        except sqlite3.Error as e:
+            log.error("Failed to persist {} entry {}: {}", self.table, key, str(e))
+        return True
+
+    async def purge(self) -> int:
+        return await asyncio.to_thread(self._disk_purge)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
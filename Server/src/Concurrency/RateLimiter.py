@@ -0,0 +1,158 @@
+import asyncio
+import time
+from typing import Any, Dict, Hashable, Optional
+
+from loguru import logger as log
+from src.Concurrency.SharedState import SharedState
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate adapts to how the upstream responds.
+
+    The rate is cut multiplicatively when the upstream throttles us and grows
+    back additively on every accepted request, so steady-state throughput
+    settles just under the highest rate the upstream tolerates. Waiters are
+    served in FIFO order.
+
+    With ``shared`` the bucket and its rate live in the shared state file, so
+    every worker process draws from one budget and sees each other's backoff.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, min_rate: float,
+                 backoff: float = 0.5, recovery: float = 0.1, shared: Optional[SharedState] = None):
+        self.name = name
+        self.shared = shared
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self.backoff = backoff
+        self.recovery = recovery
+        self.rate = rate
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+        self.counters = {"acquired": 0, "throttled": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def _acquire_local(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            # Re-evaluated after the sleep in case the rate changed meanwhile.
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def _acquire_shared(self) -> None:
+        while True:
+            wait, self.rate = await asyncio.to_thread(self.shared.take_token, self.name, self.max_rate, self.burst)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def acquire(self) -> float:
+        """Wait for a token and return the seconds spent waiting."""
+        start = time.monotonic()
+        self._waiting += 1
+        try:
+            async with self._lock:
+                if self.shared is not None:
+                    await self._acquire_shared()
+                else:
+                    await self._acquire_local()
+        finally:
+            self._waiting -= 1
+        waited = time.monotonic() - start
+        self.counters["acquired"] += 1
+        self.counters["total_wait"] += waited
+        self.counters["max_wait"] = max(self.counters["max_wait"], waited)
+        return waited
+
+    async def on_success(self) -> None:
+        if self.rate >= self.max_rate:
+            return
+        if self.shared is not None:
+            self.rate = await asyncio.to_thread(self.shared.adjust_rate, self.name, self.max_rate, self.burst,
+                                                increment=self.recovery)
+            return
+        self._refill(time.monotonic())
+        self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    async def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        self.counters["throttled"] += 1
+        if self.shared is not None:
+            self.rate = await asyncio.to_thread(self.shared.adjust_rate, self.name, self.max_rate, self.burst,
+                                                factor=self.backoff, floor=self.min_rate, pause=retry_after)
+            log.warning("{} throttled upstream, shared rate lowered to {:.2f}/s", self.name, self.rate)
+            return
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate * self.backoff)
+        # Drop any saved-up burst so the reduced rate takes effect immediately.
+        self._tokens = min(self._tokens, 0.0)
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        log.warning("{} throttled upstream, rate lowered to {:.2f}/s", self.name, self.rate)
+
+    def has_headroom(self) -> bool:
+        """Whether a request could go out now without queueing or eating into a backoff.
+
+        Locally that also needs half the burst saved up; the shared bucket's level is not
+        known without a round trip, so there only waiters and the rate are checked.
+        """
+        if self._waiting or self.rate < self.max_rate:
+            return False
+        if self.shared is not None:
+            return True
+        now = time.monotonic()
+        if now < self._paused_until:
+            return False
+        self._refill(now)
+        return self._tokens >= self.burst / 2
+
+    def stats(self) -> Dict[str, Any]:
+        acquired = self.counters["acquired"]
+        return {
+            **self.counters,
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "queue_depth": self._waiting,
+            "avg_wait": round(self.counters["total_wait"] / acquired, 4) if acquired else 0.0,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
+
+
+class RateLimiterGroup:
+    """Set of adaptive limiters, one independent budget per key (host-wide when ``shared``)."""
+
+    def __init__(self, name: str, rate: float, burst: float, min_rate: float,
+                 backoff: float = 0.5, recovery: float = 0.1, shared: Optional[SharedState] = None):
+        self.name = name
+        self._settings = dict(rate=rate, burst=burst, min_rate=min_rate, backoff=backoff, recovery=recovery,
+                              shared=shared)
+        self._limiters: Dict[Hashable, AdaptiveRateLimiter] = {}
+
+    def get(self, key: Hashable) -> AdaptiveRateLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(f"{self.name}:{key}", **self._settings)
+            self._limiters[key] = limiter
+        return limiter
+
+    async def acquire(self, key: Hashable) -> float:
+        return await self.get(key).acquire()
+
+    def has_headroom(self) -> bool:
+        return all(limiter.has_headroom() for limiter in self._limiters.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {str(key): limiter.stats() for key, limiter in self._limiters.items()}
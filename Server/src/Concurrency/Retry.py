@@ -0,0 +1,136 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from loguru import logger as log
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class Deadline:
+    """Absolute point in time shared by every stage of one request."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+class RetryPolicy:
+    """Retry retryable failures with full-jitter exponential backoff, never past a deadline."""
+
+    def __init__(self, name: str, max_attempts: int, base_delay: float, max_delay: float, deadline: float,
+                 is_retryable: Callable[[BaseException], bool]):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.is_retryable = is_retryable
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "deadline_exceeded": 0}
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def call(self, fn: Callable[[], Awaitable[T]], deadline: Optional[Deadline] = None) -> T:
+        deadline = deadline or Deadline(self.deadline)
+        self.counters["calls"] += 1
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline.remaining()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                return await asyncio.wait_for(fn(), remaining)
+            except asyncio.TimeoutError:
+                self.counters["deadline_exceeded"] += 1
+                raise DeadlineExceeded(f"{self.name} did not finish within {deadline.timeout:g}s") from None
+            except Exception as e:
+                delay = self.backoff(attempt)
+                if attempt >= self.max_attempts or not self.is_retryable(e) or delay >= deadline.remaining():
+                    self.counters["failures"] += 1
+                    raise
+                self.counters["retries"] += 1
+                log.warning("{} attempt {} failed ({}), retrying in {:.2f}s", self.name, attempt, str(e), delay)
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters)
+
+
+class CircuitBreaker:
+    """Fail fast once an upstream keeps failing, probing it again after a cool-down.
+
+    ``threshold`` consecutive failures open the circuit. After ``reset_timeout``
+    seconds a single trial call is let through; its outcome closes the circuit
+    or re-opens it for another cool-down. A trial that never reports back within
+    ``reset_timeout`` is written off and another one is let through.
+    """
+
+    def __init__(self, name: str, threshold: int, reset_timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started = 0.0
+        self.counters = {"opened": 0, "rejected": 0}
+
+    def check(self) -> None:
+        """Raise ``CircuitOpenError`` if calls are currently not allowed through."""
+        if self.state == "closed":
+            return
+        now = time.monotonic()
+        if self.state == "open" and now - self._opened_at >= self.reset_timeout:
+            log.info("{} circuit half-open, letting a trial call through", self.name)
+            self.state = "half_open"
+            self._trial_started = now
+            return
+        if self.state == "half_open" and now - self._trial_started >= self.reset_timeout:
+            log.warning("{} circuit trial call never reported back, letting another through", self.name)
+            self._trial_started = now
+            return
+        self.counters["rejected"] += 1
+        raise CircuitOpenError(f"{self.name} circuit is open; upstream is rejecting requests")
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            log.info("{} circuit closed", self.name)
+        self.state = "closed"
+        self._failures = 0
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self._failures >= self.threshold):
+            log.warning("{} circuit opened after {} consecutive failures", self.name, self._failures)
+            self._open()
+
+    def record_inconclusive(self) -> None:
+        """Record a call that ended without saying anything about the upstream's health, e.g. cancelled.
+
+        Only matters for the trial call: the circuit re-opens so a later call can try again.
+        """
+        if self.state == "half_open":
+            log.info("{} circuit trial call was inconclusive, re-opening", self.name)
+            self._open()
+
+    def _open(self) -> None:
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self.counters["opened"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "state": self.state, "consecutive_failures": self._failures}
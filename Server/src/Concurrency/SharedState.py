@@ -0,0 +1,343 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+from loguru import logger as log
+from src.Concurrency.SingleFlight import SingleFlight
+
+T = TypeVar("T")
+
+# SQLite file through which worker processes share rate budgets, in-flight leases and
+# LLM slots. Unset (the default) keeps all of that in-process, which is right for a
+# single worker; the production gunicorn config sets it.
+SHARED_STATE_PATH = os.getenv("CHROMLM_SHARED_STATE_PATH", "")
+# Upper bound on how long a lease outlives a worker that died without releasing it.
+SHARED_LEASE_TTL = float(os.getenv("CHROMLM_SHARED_LEASE_TTL", "300"))
+SHARED_POLL_INTERVAL = float(os.getenv("CHROMLM_SHARED_POLL_INTERVAL", "0.05"))
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedState:
+    """Token buckets, leases and job snapshots kept in a SQLite file shared by the workers of one host.
+
+    Every operation is a short ``BEGIN IMMEDIATE`` transaction, so concurrent workers
+    see each other's updates atomically. Times are wall-clock since they are compared
+    across processes. Leases record the holder's pid and are treated as free once that
+    process is gone, so a crashed worker never blocks the others for the full TTL.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, and gunicorn forks workers after importing the app.
+        if self._conn is None or self._pid != os.getpid():
+            log.info("Opening shared state at {} (pid {})", self.path, os.getpid())
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, "
+                "rate REAL NOT NULL, paused_until REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, pid INTEGER NOT NULL, expires REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, snapshot TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires)")
+        return self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _bucket(conn: sqlite3.Connection, name: str, max_rate: float, burst: float,
+                now: float) -> Tuple[float, float, float]:
+        """Return the bucket's ``(tokens, rate, paused_until)`` refilled up to ``now``.
+
+        New buckets start full at ``max_rate``; stored rates are capped at it in case
+        the configured rate was lowered since the row was written.
+        """
+        row = conn.execute("SELECT tokens, updated, rate, paused_until FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return burst, max_rate, 0.0
+        tokens, updated, rate, paused_until = row
+        rate = min(rate, max_rate)
+        return min(burst, tokens + max(0.0, now - updated) * rate), rate, paused_until
+
+    @staticmethod
+    def _store_bucket(conn: sqlite3.Connection, name: str, tokens: float, now: float, rate: float,
+                      paused_until: float) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (name, tokens, updated, rate, paused_until) VALUES (?, ?, ?, ?, ?)",
+            (name, tokens, now, rate, paused_until)
+        )
+
+    def take_token(self, name: str, max_rate: float, burst: float) -> Tuple[float, float]:
+        """Take a token from the named bucket if one is available.
+
+        Returns ``(wait, rate)``: ``wait`` is 0 when a token was taken, otherwise the
+        seconds until one should be; ``rate`` is the bucket's current refill rate.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            tokens, rate, paused_until = self._bucket(conn, name, max_rate, burst, now)
+            if now < paused_until:
+                wait = paused_until - now
+            elif tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._store_bucket(conn, name, tokens, now, rate, paused_until)
+        return wait, rate
+
+    def adjust_rate(self, name: str, max_rate: float, burst: float, factor: float = 1.0, increment: float = 0.0,
+                    floor: float = 0.0, pause: Optional[float] = None) -> float:
+        """Scale and shift the bucket's rate within ``[floor, max_rate]`` and return the new rate.
+
+        Lowering the rate also drops any saved-up burst; ``pause`` stops all takers for that many seconds.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            tokens, rate, paused_until = self._bucket(conn, name, max_rate, burst, now)
+            new_rate = min(max_rate, max(floor, rate * factor + increment))
+            if new_rate < rate:
+                tokens = min(tokens, 0.0)
+            if pause:
+                paused_until = max(paused_until, now + pause)
+            self._store_bucket(conn, name, tokens, now, new_rate, paused_until)
+        return new_rate
+
+    def _lease_free(self, conn: sqlite3.Connection, name: str, now: float) -> bool:
+        row = conn.execute("SELECT pid, expires FROM leases WHERE name = ?", (name,)).fetchone()
+        return row is None or row[1] <= now or not _alive(row[0])
+
+    def try_lease(self, name: str, ttl: float = SHARED_LEASE_TTL) -> bool:
+        """Take the named lease for this process unless another holder is alive."""
+        now = time.time()
+        with self._transaction() as conn:
+            if not self._lease_free(conn, name, now):
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (name, pid, expires) VALUES (?, ?, ?)",
+                         (name, os.getpid(), now + ttl))
+        return True
+
+    def try_any_lease(self, names: List[str], ttl: float = SHARED_LEASE_TTL) -> Optional[str]:
+        """Take the first free lease among ``names``, e.g. one of N concurrency slots."""
+        now = time.time()
+        with self._transaction() as conn:
+            for name in names:
+                if self._lease_free(conn, name, now):
+                    conn.execute("INSERT OR REPLACE INTO leases (name, pid, expires) VALUES (?, ?, ?)",
+                                 (name, os.getpid(), now + ttl))
+                    return name
+        return None
+
+    def lease_held(self, name: str) -> bool:
+        # A plain read, so waiters polling a lease never compete with writers for the write lock.
+        with self._lock:
+            return not self._lease_free(self._connection(), name, time.time())
+
+    def release(self, name: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND pid = ?", (name, os.getpid()))
+
+    def put_job(self, job_id: str, snapshot: str, ttl: float) -> None:
+        """Store a job's JSON snapshot for ``ttl`` seconds, dropping snapshots that have expired."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs (id, snapshot, expires) VALUES (?, ?, ?)",
+                         (job_id, snapshot, now + ttl))
+            conn.execute("DELETE FROM jobs WHERE expires < ?", (now,))
+
+    def get_job(self, job_id: str) -> Optional[str]:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT snapshot FROM jobs WHERE id = ? AND expires >= ?",
+                               (job_id, time.time())).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+async def _claim(state: SharedState, take: Callable[[], Optional[str]]) -> Optional[str]:
+    """Run a lease-taking call in a thread; if the caller is cancelled meanwhile, give back what it took."""
+    future = asyncio.ensure_future(asyncio.to_thread(take))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        def give_back(done: asyncio.Future) -> None:
+            if not done.cancelled() and done.exception() is None and done.result():
+                asyncio.get_running_loop().run_in_executor(None, state.release, done.result())
+        future.add_done_callback(give_back)
+        raise
+
+
+async def _release(state: SharedState, name: str) -> None:
+    """Release a lease off the event loop; shielded so a cancelled caller still gives it back."""
+    await asyncio.shield(asyncio.ensure_future(asyncio.to_thread(state.release, name)))
+
+
+class SharedFlight:
+    """Single-flight across worker processes.
+
+    Callers in one process are coalesced by a local ``SingleFlight``; across processes a
+    lease decides who runs ``fn``. The others wait for the lease to be released and then
+    ask ``peer_result`` for what the holder published (e.g. through a shared cache),
+    running ``fn`` themselves if nothing usable was published.
+    """
+
+    def __init__(self, name: str, state: Optional[SharedState], poll_interval: float = SHARED_POLL_INTERVAL):
+        self.name = name
+        self.state = state
+        self.poll_interval = poll_interval
+        self._local = SingleFlight(name)
+        self.counters = {"peer_waits": 0, "peer_results": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]],
+                 peer_result: Callable[[], Awaitable[Optional[T]]]) -> T:
+        if self.state is None:
+            return await self._local.do(key, fn)
+        return await self._local.do(key, lambda: self._run(f"{self.name}:{key}", fn, peer_result))
+
+    async def _run(self, lease: str, fn: Callable[[], Awaitable[T]],
+                   peer_result: Callable[[], Awaitable[Optional[T]]]) -> T:
+        while True:
+            if await _claim(self.state, lambda: lease if self.state.try_lease(lease) else None):
+                try:
+                    return await fn()
+                finally:
+                    await _release(self.state, lease)
+            log.debug("{} is running in another worker, waiting for it", lease)
+            self.counters["peer_waits"] += 1
+            while await asyncio.to_thread(self.state.lease_held, lease):
+                await asyncio.sleep(self.poll_interval)
+            result = await peer_result()
+            if result is not None:
+                self.counters["peer_results"] += 1
+                return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._local.stats(), **self.counters}
+
+
+class SharedSemaphore:
+    """Semaphore whose ``slots`` are shared by every worker process, handed out by priority.
+
+    ``acquire(priority)`` serves lower numbers first, and the last ``reserve`` slots are
+    only given to priority 0, so urgent work never waits behind a full house of lower
+    priority holders. ``priority`` is a getter read whenever a slot is handed out, so a
+    waiter promoted meanwhile moves up. Waiters queue locally first, so each process polls
+    the shared slots with at most ``slots`` tasks; lower priorities only poll for the
+    unreserved ones.
+    """
+
+    def __init__(self, name: str, state: Optional[SharedState], slots: int, reserve: int = 0,
+                 poll_interval: float = SHARED_POLL_INTERVAL):
+        self.name = name
+        self.state = state
+        self.poll_interval = poll_interval
+        self.slots = slots
+        self.reserve = max(0, min(reserve, slots - 1))
+        self._slots = [f"{name}:{index}" for index in range(slots)]
+        self._in_use = 0
+        self._waiters: List[Tuple[Callable[[], int], int, asyncio.Future]] = []
+        self._sequence = 0
+
+    def _can_take(self, priority: int) -> bool:
+        return self._in_use < (self.slots if priority == 0 else self.slots - self.reserve)
+
+    def _wake(self) -> None:
+        for entry in sorted(self._waiters, key=lambda waiter: (waiter[0](), waiter[1])):
+            if self._can_take(entry[0]()):
+                self._waiters.remove(entry)
+                self._in_use += 1
+                entry[2].set_result(None)
+
+    async def _acquire_local(self, priority: Callable[[], int]) -> None:
+        rank = priority()
+        if self._can_take(rank) and not any(waiter[0]() <= rank for waiter in self._waiters):
+            self._in_use += 1
+            return
+        self._sequence += 1
+        entry = (priority, self._sequence, asyncio.get_running_loop().create_future())
+        self._waiters.append(entry)
+        try:
+            while not entry[2].done():
+                await asyncio.wait({entry[2]}, timeout=self.poll_interval)
+                # Priorities may have changed while waiting (a promoted job); hand out what that frees up.
+                self._wake()
+        except asyncio.CancelledError:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            else:
+                # Granted just as we were cancelled; pass the slot on.
+                self._release_local()
+            raise
+
+    def _release_local(self) -> None:
+        self._in_use -= 1
+        self._wake()
+
+    async def acquire(self, priority: Callable[[], int] = lambda: 0) -> Optional[str]:
+        """Wait for a slot and return its token for ``release``."""
+        await self._acquire_local(priority)
+        if self.state is None:
+            return None
+        try:
+            while True:
+                # Urgent work tries the reserved slots first to leave the others to everyone else.
+                names = self._slots[::-1] if priority() == 0 else self._slots[:self.slots - self.reserve]
+                slot = await _claim(self.state, lambda: self.state.try_any_lease(names))
+                if slot is not None:
+                    return slot
+                await asyncio.sleep(self.poll_interval)
+        except BaseException:
+            self._release_local()
+            raise
+
+    async def release(self, slot: Optional[str]) -> None:
+        try:
+            if slot is not None:
+                await _release(self.state, slot)
+        finally:
+            self._release_local()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"slots": self.slots, "reserve": self.reserve, "in_use": self._in_use, "waiting": len(self._waiters)}
+
+
+shared_state = SharedState(SHARED_STATE_PATH) if SHARED_STATE_PATH else None
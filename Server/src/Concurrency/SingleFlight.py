@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from loguru import logger as log
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto one in-flight task.
+
+    Every waiter receives the shared result or exception. A cancelled waiter
+    only detaches itself; the shared task is cancelled once no waiters remain.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self.counters = {"executions": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None or call.task.cancelled():
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self.counters["executions"] += 1
+        else:
+            log.debug("Joining in-flight {} call for {}", self.name, key)
+            self.counters["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                log.debug("All waiters left {} call for {}, cancelling it", self.name, key)
+                # Forget it now, not in the done callback, so a caller arriving before the
+                # cancellation lands starts a fresh call instead of joining a dying one.
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # Mark the exception as retrieved; waiters have already re-raised it.
+            call.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "in_flight": len(self._calls)}
@@ -1,30 +1,32 @@
 from typing import Any, Dict
 from loguru import logger as log
 from src.Aggregators.InstagramAggregator import aggregate_data as ig_aggregate_data
+from src.Instagram.Records import Post, Profile
+from src.Observability.Metrics import stage_timer
 
 
 class DataStandardizer:
     @staticmethod
     def standardize_instagram_data(aggregated_data: Dict[str, Any]) -> Dict[str, Any]:
-        profile = aggregated_data.get("profile_data", {})
-        post = aggregated_data.get("post_data", {})
+        profile: Profile = aggregated_data["profile_data"]
+        post: Post = aggregated_data["post_data"]
 
         comments = [
             {
-                "user": comment.get("owner"),
-                "comment": comment.get("text"),
+                "user": comment.owner,
+                "comment": comment.text,
                 "replies": [
                     {
-                        "user": reply.get("owner"),
-                        "comment": reply.get("text")
+                        "user": reply.owner,
+                        "comment": reply.text
                     }
-                    for reply in comment.get("replies", [])
+                    for reply in comment.replies
                 ]
             }
-            for comment in post.get("comments", [])
+            for comment in post.comments
         ]
 
-        captions = post.get("captions", [])
+        captions = post.captions
         hashtags = []
         for caption in captions:
             if caption:
@@ -32,17 +34,17 @@ class DataStandardizer:
 
         return {
             "profile": {
-                "username": profile.get("username"),
-                "nickname": profile.get("full_name"),
-                "bio": profile.get("bio", None),
-                "verified": profile.get("is_verified"),
-                "bioLinks": None if profile.get("external_url") == "" else profile.get("external_url", None),
-                "followerCount": profile.get("follower_count"),
-                "followingCount": profile.get("following_count")
+                "username": profile.username,
+                "nickname": profile.full_name,
+                "bio": profile.bio,
+                "verified": profile.is_verified,
+                "bioLinks": profile.external_url or None,
+                "followerCount": profile.follower_count,
+                "followingCount": profile.following_count
             },
             "post": {
-                "title": None if captions == [] or captions[0] == "" else captions[0],
-                "likes": post.get("likes"),
+                "title": captions[0] if captions and captions[0] else None,
+                "likes": post.likes,
                 "tags": hashtags
             },
             "comments": comments
@@ -55,7 +57,8 @@ class DataStandardizer:
         }
 
         if platform in platform_standardizers:
-            return platform_standardizers[platform](aggregated_data)
+            with stage_timer("standardize"):
+                return platform_standardizers[platform](aggregated_data)
         else:
             raise ValueError("Unsupported platform")
 
@@ -0,0 +1,156 @@
+import os
+import random
+from typing import Dict, Optional
+
+import httpx
+from loguru import logger as log
+from src.Concurrency.RateLimiter import RateLimiterGroup
+from src.Concurrency.Retry import CircuitBreaker, RetryPolicy
+from src.Concurrency.SharedState import shared_state
+
+INSTAGRAM_GRAPHQL_URL = os.getenv("CHROMLM_INSTAGRAM_GRAPHQL_URL", "https://www.instagram.com/graphql/query")
+INSTAGRAM_MAX_CONNECTIONS = int(os.getenv("CHROMLM_INSTAGRAM_MAX_CONNECTIONS", "20"))
+INSTAGRAM_MAX_KEEPALIVE = int(os.getenv("CHROMLM_INSTAGRAM_MAX_KEEPALIVE", "10"))
+INSTAGRAM_KEEPALIVE_EXPIRY = float(os.getenv("CHROMLM_INSTAGRAM_KEEPALIVE_EXPIRY", "30"))
+INSTAGRAM_HTTP2 = os.getenv("CHROMLM_INSTAGRAM_HTTP2", "0") == "1"
+INSTAGRAM_TIMEOUT = float(os.getenv("CHROMLM_INSTAGRAM_TIMEOUT", "10"))
+# Requests per second allowed per GraphQL document; the limiter backs off below
+# this on throttling and climbs back by RECOVERY per accepted request.
+INSTAGRAM_RATE = float(os.getenv("CHROMLM_INSTAGRAM_RATE", "5"))
+INSTAGRAM_BURST = float(os.getenv("CHROMLM_INSTAGRAM_BURST", "5"))
+INSTAGRAM_MIN_RATE = float(os.getenv("CHROMLM_INSTAGRAM_MIN_RATE", "0.2"))
+INSTAGRAM_RATE_BACKOFF = float(os.getenv("CHROMLM_INSTAGRAM_RATE_BACKOFF", "0.5"))
+INSTAGRAM_RATE_RECOVERY = float(os.getenv("CHROMLM_INSTAGRAM_RATE_RECOVERY", "0.05"))
+# One scrape's attempts and the whole post+profile fetch share this deadline.
+INSTAGRAM_DEADLINE = float(os.getenv("CHROMLM_INSTAGRAM_DEADLINE", "20"))
+INSTAGRAM_MAX_ATTEMPTS = int(os.getenv("CHROMLM_INSTAGRAM_MAX_ATTEMPTS", "3"))
+INSTAGRAM_RETRY_BASE_DELAY = float(os.getenv("CHROMLM_INSTAGRAM_RETRY_BASE_DELAY", "0.5"))
+INSTAGRAM_RETRY_MAX_DELAY = float(os.getenv("CHROMLM_INSTAGRAM_RETRY_MAX_DELAY", "4"))
+# Consecutive rejected requests that open the circuit, and seconds before it is probed again.
+INSTAGRAM_BREAKER_THRESHOLD = int(os.getenv("CHROMLM_INSTAGRAM_BREAKER_THRESHOLD", "5"))
+INSTAGRAM_BREAKER_RESET = float(os.getenv("CHROMLM_INSTAGRAM_BREAKER_RESET", "30"))
+# Extract every field of posts and profiles instead of only what the classifier reads (archival/research runs).
+INSTAGRAM_FULL_RECORDS = os.getenv("CHROMLM_INSTAGRAM_FULL_RECORDS", "0") == "1"
+# Markers of a soft block: Instagram answers 200 but refuses to serve data.
+SOFT_BLOCK_MARKERS = (b'"require_login":true', b"Please wait a few minutes", b'"spam":true')
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
+]
+
+HEADERS = {
+    "accept": "*/*",
+    "accept-language": "en-US,en;q=0.9",
+    "content-type": "application/x-www-form-urlencoded",
+}
+
+
+class ScrapeError(Exception):
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, ScrapeError):
+        return error.retryable
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.RequestError)
+
+
+_client: Optional[httpx.AsyncClient] = None
+instagram_limiter = RateLimiterGroup(
+    "instagram", rate=INSTAGRAM_RATE, burst=INSTAGRAM_BURST, min_rate=INSTAGRAM_MIN_RATE,
+    backoff=INSTAGRAM_RATE_BACKOFF, recovery=INSTAGRAM_RATE_RECOVERY, shared=shared_state
+)
+instagram_breaker = CircuitBreaker("instagram", INSTAGRAM_BREAKER_THRESHOLD, INSTAGRAM_BREAKER_RESET)
+scrape_policy = RetryPolicy(
+    "instagram_scrape", max_attempts=INSTAGRAM_MAX_ATTEMPTS, base_delay=INSTAGRAM_RETRY_BASE_DELAY,
+    max_delay=INSTAGRAM_RETRY_MAX_DELAY, deadline=INSTAGRAM_DEADLINE, is_retryable=is_retryable
+)
+
+
+def request_headers() -> Dict[str, str]:
+    """Per-request headers; the user agent rotates on every call rather than per connection."""
+    return {"user-agent": random.choice(USER_AGENTS)}
+
+
+def is_soft_block(response: httpx.Response) -> bool:
+    if response.status_code in (401, 403, 429):
+        return True
+    if response.is_redirect:
+        return "login" in response.headers.get("location", "") or "challenge" in response.headers.get("location", "")
+    return any(marker in response.content for marker in SOFT_BLOCK_MARKERS)
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def post_graphql(doc_id: str, body: str) -> httpx.Response:
+    """POST a GraphQL query through the shared client under the document's rate budget.
+
+    Raises ``CircuitOpenError`` without touching the network while Instagram is
+    consistently rejecting us, and ``ScrapeError`` when a response is a soft block.
+    """
+    instagram_breaker.check()
+    # Every call past check() must report to the breaker, or a half-open circuit would never settle.
+    reported = False
+    try:
+        limiter = instagram_limiter.get(doc_id)
+        await limiter.acquire()
+        try:
+            response = await get_http_client().post(url=INSTAGRAM_GRAPHQL_URL, data=body, headers=request_headers())
+        except httpx.RequestError:
+            instagram_breaker.record_failure()
+            reported = True
+            raise
+        if is_soft_block(response):
+            instagram_breaker.record_failure()
+            reported = True
+            await limiter.on_throttled(retry_after(response))
+            raise ScrapeError(f"Instagram refused the request (HTTP {response.status_code})", retryable=True)
+        if response.status_code >= 500:
+            instagram_breaker.record_failure()
+            reported = True
+        elif response.is_success:
+            instagram_breaker.record_success()
+            reported = True
+            await limiter.on_success()
+        return response
+    finally:
+        if not reported:
+            # Cancelled (deadline, client gone) or an answer such as a 404 that says nothing either way.
+            instagram_breaker.record_inconclusive()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide Instagram client, creating it on first use."""
+    global _client
+    if _client is None:
+        log.info("Creating shared Instagram HTTP client (http2={})", INSTAGRAM_HTTP2)
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            http2=INSTAGRAM_HTTP2,
+            timeout=httpx.Timeout(INSTAGRAM_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=INSTAGRAM_MAX_CONNECTIONS,
+                max_keepalive_connections=INSTAGRAM_MAX_KEEPALIVE,
+                keepalive_expiry=INSTAGRAM_KEEPALIVE_EXPIRY
+            )
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        log.info("Closing shared Instagram HTTP client")
+        await _client.aclose()
+        _client = None
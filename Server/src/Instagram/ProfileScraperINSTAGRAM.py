@@ -1,40 +1,16 @@
-import asyncio
 import json
-import random
-from contextlib import asynccontextmanager
-from typing import Dict, AsyncGenerator
 from urllib.parse import quote
 
-import asyncio_throttle
 import httpx
 from loguru import logger as log
-from tenacity import retry, stop_after_attempt, wait_fixed
+from src.Instagram.HttpClient import INSTAGRAM_FULL_RECORDS, INSTAGRAM_GRAPHQL_URL, ScrapeError, post_graphql
+from src.Instagram.Records import Profile, decode_profile, to_dict
+from src.Observability.Logging import LOG_PAYLOADS
 
 INSTAGRAM_PROFILE_DOCUMENT_ID = "9539110062771438"  
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
-]
 
-HEADERS = {
-    "accept": "*/*",
-    "accept-language": "en-US,en;q=0.9",
-    "content-type": "application/x-www-form-urlencoded",
-}
 
-
-@asynccontextmanager
-async def get_http_client() -> AsyncGenerator[httpx.AsyncClient, None]:
-    headers = HEADERS.copy()
-    headers["user-agent"] = random.choice(USER_AGENTS)
-    log.debug("Using headers: {}", headers)
-    async with httpx.AsyncClient(headers=headers, timeout=httpx.Timeout(10.0)) as client:
-        yield client
-
-
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-async def scrape_profile(username: str) -> Dict:
+async def scrape_profile(username: str, full: bool = INSTAGRAM_FULL_RECORDS) -> Profile:
     log.info("Scraping profile data for {}", username)
     """Scrape Instagram profile data"""
     variables = quote(json.dumps({
@@ -42,64 +18,40 @@ async def scrape_profile(username: str) -> Dict:
         'render_surface': 'PROFILE'
     }, separators=(',', ':')))
     body = f"variables={variables}&doc_id={INSTAGRAM_PROFILE_DOCUMENT_ID}"
-    url = "https://www.instagram.com/graphql/query"
+    url = INSTAGRAM_GRAPHQL_URL
 
-    log.debug("Request body: {}", body)
+    if LOG_PAYLOADS:
+        log.debug("Request body: {}", body)
     log.debug("Request URL: {}", url)
 
-    async with get_http_client() as client:
-        try:
-            result = await client.post(url=url, data=body)
-            log.debug("Received response with status code: {}", result.status_code)
-            result.raise_for_status()
-            data = json.loads(result.content)
-            log.debug("Raw response data: {}", data)
-            user_data = data.get("data")
-            if not user_data:
-                log.error("Profile data is missing in the response.")
-                return {}
-            data = await parse_profile(user_data.get("user", {}))
-            log.success("Scraped profile data for {}", username)
-            return data
-        except httpx.RequestError as e:
-            log.error("Network error while fetching profile data for %s: %s", username, str(e))
-        except httpx.HTTPStatusError as e:
-            log.error("HTTP error while fetching profile data for %s: HTTP %s", username, e.response.status_code)
-        except json.JSONDecodeError as e:
-            log.error("Failed to decode JSON response for %s: %s", username, str(e))
-        log.info("Successfully scraped profile data.")
-    return {}
-
-
-async def parse_profile(data: Dict) -> Dict:
-    log.info("Parsing profile data from response.")
-    if not data:
+    try:
+        result = await post_graphql(INSTAGRAM_PROFILE_DOCUMENT_ID, body)
+        log.debug("Received response with status code: {}", result.status_code)
+        result.raise_for_status()
+        if LOG_PAYLOADS:
+            log.debug("Raw response data: {}", result.text)
+        profile = decode_profile(result.content, full)
+    except httpx.RequestError as e:
+        log.error("Network error while fetching profile data for {}: {}", username, str(e))
+        raise
+    except httpx.HTTPStatusError as e:
+        log.error("HTTP error while fetching profile data for {}: HTTP {}", username, e.response.status_code)
+        raise
+    except json.JSONDecodeError as e:
+        log.error("Failed to decode JSON response for {}: {}", username, str(e))
+        raise ScrapeError(f"Instagram returned a non-JSON response for profile {username}", retryable=True) from e
+    if profile is None:
         log.error("Profile data is empty or not available.")
-        return {}
-    log.debug("Parsing profile data for {}", data.get("username", "unknown"))
-    result = {
-        "username": data.get("username"),
-        "full_name": data.get("full_name"),
-        "profile_pic_url": data.get("profile_pic_url"),
-        "bio": data.get("biography"),
-        "follower_count": data.get("follower_count"),
-        "following_count": data.get("following_count"),
-        "media_count": data.get("media_count"),
-        "is_private": data.get("is_private"),
-        "is_verified": data.get("is_verified"),
-        "external_url": data.get("external_url"),
-        "category": data.get("category"),
-    }
-    log.debug("Parsed profile data: {}", result)
-    log.info("Successfully parsed profile data.")
-    return result
+        raise ScrapeError(f"Profile {username} is not available")
+    if LOG_PAYLOADS:
+        log.debug("Parsed profile data: {}", to_dict(profile))
+    log.success("Scraped profile data for {}", username)
+    return profile
 
 
 async def run(pk):
     log.info("Running Instagram profile scraper.")
-    throttle = asyncio_throttle.Throttler(rate_limit=5, period=1)  
-    async with throttle:
-        log.info("Starting profile scraping")
-        profile_data = await scrape_profile(pk)
+    log.info("Starting profile scraping")
+    profile_data = await scrape_profile(pk)
     log.success("Successfully scraped post and comment data from Instagram")
     return profile_data
\ No newline at end of file
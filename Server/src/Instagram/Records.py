@@ -0,0 +1,219 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import orjson
+
+# Records are named tuples built positionally: one allocation each, no per-instance
+# dict, and far cheaper to construct than keyword-initialised objects.
+_EMPTY: Dict[str, Any] = {}
+_NO_EDGES: Dict[str, List[Any]] = {"edges": []}
+
+
+class Reply(NamedTuple):
+    id: Optional[str]
+    text: Optional[str]
+    created_at: Optional[int]
+    owner: Optional[str]
+    owner_verified: Optional[bool]
+    viewer_has_liked: Optional[bool]
+    likes: Optional[int]
+
+
+class Comment(NamedTuple):
+    id: Optional[str]
+    text: Optional[str]
+    created_at: Optional[int]
+    owner: Optional[str]
+    owner_verified: Optional[bool]
+    viewer_has_liked: Optional[bool]
+    likes: Optional[int]
+    replies: List[Reply]
+
+
+class Post(NamedTuple):
+    username: Optional[str]
+    pk: Optional[str]
+    id: Optional[str]
+    shortcode: Optional[str]
+    dimensions: Optional[Dict[str, int]]
+    src: Optional[str]
+    thumbnail_src: Optional[str]
+    media_preview: Optional[str]
+    video_url: Optional[str]
+    views: Optional[int]
+    likes: Optional[int]
+    location: Optional[str]
+    taken_at: Optional[int]
+    related: List[str]
+    type: Optional[str]
+    video_duration: Optional[float]
+    music: Optional[Dict[str, Any]]
+    is_video: Optional[bool]
+    tagged_users: List[str]
+    captions: List[str]
+    related_profiles: List[str]
+    comments: List[Comment]
+    related_profile_ids: List[str]
+
+
+class Profile(NamedTuple):
+    username: Optional[str]
+    full_name: Optional[str]
+    profile_pic_url: Optional[str]
+    bio: Optional[str]
+    follower_count: Optional[int]
+    following_count: Optional[int]
+    media_count: Optional[int]
+    is_private: Optional[bool]
+    is_verified: Optional[bool]
+    external_url: Optional[str]
+    category: Optional[str]
+
+
+def to_dict(record: Any) -> Any:
+    """Plain-dict view of a record and everything nested in it, e.g. for logging."""
+    if isinstance(record, tuple) and hasattr(record, "_fields"):
+        return {name: to_dict(value) for name, value in zip(record._fields, record)}
+    if isinstance(record, list):
+        return [to_dict(item) for item in record]
+    return record
+
+
+def _edges(data: Dict[str, Any], key: str) -> List[Dict[str, Any]]:
+    return (data.get(key) or _NO_EDGES).get("edges") or []
+
+
+def _reply(node: Dict[str, Any]) -> Reply:
+    owner = node.get("owner") or _EMPTY
+    return Reply(
+        node.get("id"),
+        node.get("text"),
+        node.get("created_at"),
+        owner.get("username"),
+        owner.get("is_verified"),
+        node.get("viewer_has_liked"),
+        (node.get("edge_liked_by") or _EMPTY).get("count"),
+    )
+
+
+def _comment(node: Dict[str, Any]) -> Comment:
+    owner = node.get("owner") or _EMPTY
+    return Comment(
+        node.get("id"),
+        node.get("text"),
+        node.get("created_at"),
+        owner.get("username"),
+        owner.get("is_verified"),
+        node.get("viewer_has_liked"),
+        (node.get("edge_liked_by") or _EMPTY).get("count"),
+        [_reply(edge["node"]) for edge in _edges(node, "edge_threaded_comments") if edge.get("node")],
+    )
+
+
+def _lean_reply(node: Dict[str, Any]) -> Reply:
+    return Reply(node.get("id"), node.get("text"), None, (node.get("owner") or _EMPTY).get("username"),
+                 None, None, None)
+
+
+def _lean_comment(node: Dict[str, Any]) -> Comment:
+    return Comment(
+        node.get("id"), node.get("text"), None, (node.get("owner") or _EMPTY).get("username"), None, None, None,
+        [_lean_reply(edge["node"]) for edge in _edges(node, "edge_threaded_comments") if edge.get("node")],
+    )
+
+
+def _related(media: Dict[str, Any]) -> List[str]:
+    return [(edge.get("node") or _EMPTY).get("shortcode") for edge in _edges(media, "edge_web_media_to_related_media")]
+
+
+def _related_profile_ids(media: Dict[str, Any]) -> List[str]:
+    return [(edge.get("node") or _EMPTY).get("id") for edge in _edges(media, "edge_related_profiles")]
+
+
+def parse_post(media: Dict[str, Any], full: bool = False) -> Optional[Post]:
+    """Turn an ``xdt_shortcode_media`` object into a ``Post`` in one walk over it.
+
+    By default only what the standardizer and the prefetcher read is extracted (owner,
+    captions, likes, comment/reply authors and text, related post shortcodes and related
+    profile ids) and every other field is left ``None`` or empty.
+    ``full=True`` extracts everything, for archival and research runs.
+    """
+    if not media:
+        return None
+    owner = media.get("owner") or _EMPTY
+    if not full:
+        return Post(
+            owner.get("username"), owner.get("id"), media.get("id"), media.get("shortcode"),
+            None, None, None, None, None, None,
+            (media.get("edge_media_preview_like") or _EMPTY).get("count"),
+            None, None, _related(media), None, None, None, None, [],
+            [(edge.get("node") or _EMPTY).get("text") for edge in _edges(media, "edge_media_to_caption")],
+            [],
+            [_lean_comment(edge["node"]) for edge in _edges(media, "edge_media_to_parent_comment")
+             if edge.get("node")],
+            _related_profile_ids(media),
+        )
+    location = media.get("location")
+    return Post(
+        owner.get("username"),
+        owner.get("id"),
+        media.get("id"),
+        media.get("shortcode"),
+        media.get("dimensions"),
+        media.get("display_url"),
+        media.get("thumbnail_src"),
+        media.get("media_preview"),
+        media.get("video_url"),
+        media.get("video_view_count"),
+        (media.get("edge_media_preview_like") or _EMPTY).get("count"),
+        location.get("name") if location else None,
+        media.get("taken_at_timestamp"),
+        _related(media),
+        media.get("product_type"),
+        media.get("video_duration"),
+        media.get("clips_music_attribution_info"),
+        media.get("is_video"),
+        [((edge.get("node") or _EMPTY).get("user") or _EMPTY).get("username")
+         for edge in _edges(media, "edge_media_to_tagged_user")],
+        [(edge.get("node") or _EMPTY).get("text") for edge in _edges(media, "edge_media_to_caption")],
+        [(edge.get("node") or _EMPTY).get("username")
+         for edge in _edges(media, "edge_related_profiles")],
+        [_comment(edge["node"]) for edge in _edges(media, "edge_media_to_parent_comment") if edge.get("node")],
+        _related_profile_ids(media),
+    )
+
+
+def parse_profile(user: Dict[str, Any], full: bool = False) -> Optional[Profile]:
+    """Turn a profile query's ``user`` object into a ``Profile``, projected like ``parse_post``."""
+    if not user:
+        return None
+    if not full:
+        return Profile(
+            user.get("username"), user.get("full_name"), None, user.get("biography"), user.get("follower_count"),
+            user.get("following_count"), None, None, user.get("is_verified"), user.get("external_url"), None,
+        )
+    return Profile(
+        user.get("username"),
+        user.get("full_name"),
+        user.get("profile_pic_url"),
+        user.get("biography"),
+        user.get("follower_count"),
+        user.get("following_count"),
+        user.get("media_count"),
+        user.get("is_private"),
+        user.get("is_verified"),
+        user.get("external_url"),
+        user.get("category"),
+    )
+
+
+def decode_post(content: bytes, full: bool = False) -> Optional[Post]:
+    """Decode a post query response into a ``Post``; the raw payload is dropped as soon as it is walked.
+
+    Raises ``json.JSONDecodeError`` (which ``orjson.JSONDecodeError`` subclasses) on malformed bodies.
+    """
+    return parse_post(((orjson.loads(content) or _EMPTY).get("data") or _EMPTY).get("xdt_shortcode_media"), full)
+
+
+def decode_profile(content: bytes, full: bool = False) -> Optional[Profile]:
+    """Decode a profile query response into a ``Profile``."""
+    return parse_profile(((orjson.loads(content) or _EMPTY).get("data") or _EMPTY).get("user"), full)
@@ -0,0 +1,320 @@
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from loguru import logger as log
+from src.Concurrency.SharedState import SHARED_LEASE_TTL, SHARED_POLL_INTERVAL, SharedState
+from src.Observability.Metrics import request_id
+
+# Queued jobs accepted per process before submissions are shed with 503.
+JOB_QUEUE_DEPTH = int(os.getenv("CHROMLM_JOB_QUEUE_DEPTH", "128"))
+# Share of the depth background jobs may fill; the rest is kept for interactive ones.
+JOB_BACKGROUND_SHARE = float(os.getenv("CHROMLM_JOB_BACKGROUND_SHARE", "0.75"))
+# Jobs run at once per process. About twice the LLM concurrency keeps scraping
+# overlapped with generation without letting background work pile up on the model.
+JOB_WORKERS = int(os.getenv("CHROMLM_JOB_WORKERS", "4"))
+# Workers background jobs may never occupy, so an interactive job always starts right away.
+JOB_INTERACTIVE_RESERVE = int(os.getenv("CHROMLM_JOB_INTERACTIVE_RESERVE", "1"))
+# Seconds a finished job's result stays available for polling.
+JOB_RESULT_TTL = float(os.getenv("CHROMLM_JOB_RESULT_TTL", "600"))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+# Speculative analyses of posts the user is likely to open next; only the prefetcher submits these.
+PREFETCH = "prefetch"
+PRIORITIES = (INTERACTIVE, BACKGROUND, PREFETCH)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Returns the priority of the job the current task works for. A getter rather than a value so a
+# job promoted while it runs is served at its new priority from then on.
+job_priority: ContextVar[Callable[[], str]] = ContextVar("job_priority", default=lambda: INTERACTIVE)
+
+
+def priority_rank() -> Callable[[], int]:
+    """Rank (0 is most urgent) of the current task's priority, following later promotions."""
+    priority = job_priority.get()
+    return lambda: PRIORITIES.index(priority())
+
+
+class QueueFull(Exception):
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"The {priority} job queue is full, retry in {retry_after}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    id: str
+    url: str
+    shortcode: str
+    priority: str
+    options: Dict[str, Any] = field(default_factory=dict)
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cache: Optional[str] = None
+    # ID of the request that queued the job, so its logs can be traced back to it.
+    request_id: str = "-"
+    finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    started: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "shortcode": self.shortcode,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == DONE:
+            snapshot["result"] = self.result
+            snapshot["cache"] = self.cache
+        elif self.status == FAILED:
+            snapshot["error"] = self.error
+        return snapshot
+
+
+Handler = Callable[[Job], Awaitable[Dict[str, Any]]]
+
+
+class JobQueue:
+    """Bounded, prioritized queue of analysis jobs run by a fixed set of worker tasks.
+
+    Jobs are dequeued in priority order (interactive, background, prefetch), the
+    lower classes are shed first when the queue fills up, and ``interactive_reserve``
+    workers never pick up anything but interactive work. Submitting a shortcode that is already queued
+    or running returns the existing job (promoting it if the new request is
+    interactive). With ``shared`` the job snapshots are mirrored to the shared
+    state so any worker process can answer a poll.
+    """
+
+    def __init__(self, handler: Handler, depth: int = JOB_QUEUE_DEPTH, workers: int = JOB_WORKERS,
+                 background_share: float = JOB_BACKGROUND_SHARE, interactive_reserve: int = JOB_INTERACTIVE_RESERVE,
+                 result_ttl: float = JOB_RESULT_TTL, shared: Optional[SharedState] = None):
+        self.handler = handler
+        self.depth = depth
+        self.background_depth = max(1, int(depth * background_share))
+        self.workers = workers
+        self.background_workers = max(1, workers - interactive_reserve)
+        self.result_ttl = result_ttl
+        self.shared = shared
+        self._queues: Dict[str, Deque[Job]] = {priority: deque() for priority in PRIORITIES}
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[str, Job] = {}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._ready = asyncio.Condition()
+        self._tasks: Set[asyncio.Task] = set()
+        self._avg_duration = 5.0
+        self.counters = {"submitted": 0, "joined": 0, "promoted": 0, "shed": 0, "completed": 0, "failed": 0}
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            task = asyncio.create_task(self._work(), name=f"job-worker-{index}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        if priority is None:
+            return sum(len(queue) for queue in self._queues.values())
+        return len(self._queues[priority])
+
+    def running(self, priority: Optional[str] = None) -> int:
+        if priority is None:
+            return sum(self._running.values())
+        return self._running[priority]
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained, from the recent job duration."""
+        backlog = self.queued() + self.running()
+        return max(1, min(120, math.ceil(backlog * self._avg_duration / self.workers)))
+
+    def _admit(self, priority: str) -> None:
+        queued = self.queued()
+        limit = self.depth if priority == INTERACTIVE else self.background_depth
+        if queued >= limit:
+            self.counters["shed"] += 1
+            raise QueueFull(priority, self.retry_after())
+
+    async def submit(self, url: str, shortcode: str, priority: str = INTERACTIVE,
+                     options: Optional[Dict[str, Any]] = None) -> Job:
+        """Queue a job, or return the one already queued or running for ``shortcode``.
+
+        Joining with a more urgent priority promotes the job, also when it already runs.
+
+        Raises ``QueueFull`` when the priority class has no room left.
+        """
+        self._prune()
+        existing = self._active.get(shortcode)
+        if existing is not None:
+            self.counters["joined"] += 1
+            if existing.status in (QUEUED, RUNNING) and PRIORITIES.index(priority) < PRIORITIES.index(existing.priority):
+                async with self._ready:
+                    if existing.status == QUEUED:
+                        self._queues[existing.priority].remove(existing)
+                        self._queues[priority].append(existing)
+                    else:
+                        self._running[existing.priority] -= 1
+                        self._running[priority] += 1
+                    existing.priority = priority
+                    self._ready.notify()
+                self.counters["promoted"] += 1
+                await self._publish(existing)
+            return existing
+        self._admit(priority)
+        job = Job(uuid.uuid4().hex, url, shortcode, priority, options or {}, request_id=request_id.get())
+        self._jobs[job.id] = job
+        self._active[shortcode] = job
+        self.counters["submitted"] += 1
+        async with self._ready:
+            self._queues[priority].append(job)
+            self._ready.notify()
+        await self._publish(job)
+        return job
+
+    async def complete(self, url: str, shortcode: str, priority: str, result: Dict[str, Any], cache: str) -> Job:
+        """Record a job that was answered without queueing, e.g. from the verdict cache."""
+        job = Job(uuid.uuid4().hex, url, shortcode, priority, status=DONE, result=result, cache=cache)
+        job.started_at = job.finished_at = job.created_at
+        job.started.set()
+        job.finished.set()
+        self._jobs[job.id] = job
+        await self._publish(job)
+        return job
+
+    def _next(self) -> Optional[Job]:
+        if self._queues[INTERACTIVE]:
+            return self._queues[INTERACTIVE].popleft()
+        if self.running() - self._running[INTERACTIVE] >= self.background_workers:
+            return None
+        for priority in (BACKGROUND, PREFETCH):
+            if self._queues[priority]:
+                return self._queues[priority].popleft()
+        return None
+
+    async def _work(self) -> None:
+        while True:
+            async with self._ready:
+                job = self._next()
+                while job is None:
+                    await self._ready.wait()
+                    job = self._next()
+                self._running[job.priority] += 1
+            try:
+                await self._run(job)
+            finally:
+                async with self._ready:
+                    self._running[job.priority] -= 1
+                    # A background job may have been waiting for this slot.
+                    self._ready.notify()
+
+    async def _run(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.started.set()
+        await self._publish(job)
+        token = job_priority.set(lambda: job.priority)
+        try:
+            job.result = await self.handler(job)
+            job.cache = "MISS"
+            job.status = DONE
+            self.counters["completed"] += 1
+        except asyncio.CancelledError:
+            job.status, job.error = FAILED, "The server shut down before the job finished"
+            raise
+        except Exception as e:
+            log.error("Job {} for {} failed: {}", job.id, job.shortcode, str(e))
+            job.status, job.error = FAILED, str(e)
+            self.counters["failed"] += 1
+        finally:
+            job_priority.reset(token)
+            job.finished_at = time.time()
+            self._avg_duration += 0.1 * (job.finished_at - job.started_at - self._avg_duration)
+            if self._active.get(job.shortcode) is job:
+                del self._active[job.shortcode]
+            job.finished.set()
+            await asyncio.shield(self._publish(job))
+
+    async def _publish(self, job: Job) -> None:
+        if self.shared is None:
+            return
+        try:
+            # Unfinished snapshots expire like leases in case this process dies before finishing the job.
+            ttl = self.result_ttl if job.status in (DONE, FAILED) else SHARED_LEASE_TTL
+            await asyncio.to_thread(self.shared.put_job, job.id, json.dumps(job.snapshot()), ttl)
+        except Exception as e:
+            log.error("Failed to publish job {}: {}", job.id, str(e))
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.finished_at is None or job.finished_at > cutoff:
+                break
+            self._jobs.popitem(last=False)
+
+    def _snapshot(self, job: Job) -> Dict[str, Any]:
+        snapshot = job.snapshot()
+        if job.status == QUEUED:
+            ahead = sum(len(self._queues[priority]) for priority in PRIORITIES[:PRIORITIES.index(job.priority)])
+            snapshot["position"] = ahead + self._queues[job.priority].index(job) + 1
+        return snapshot
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current snapshot of a job accepted by this process or, with shared state, any other."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return self._snapshot(job)
+        if self.shared is None:
+            return None
+        stored = await asyncio.to_thread(self.shared.get_job, job_id)
+        return json.loads(stored) if stored else None
+
+    async def wait(self, job_id: str, timeout: float, started: bool = False) -> Optional[Dict[str, Any]]:
+        """Wait up to ``timeout`` seconds for the job to finish (or just start) and return its snapshot."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            try:
+                await asyncio.wait_for((job.started if started else job.finished).wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self._snapshot(job)
+        deadline = time.monotonic() + timeout
+        snapshot = await self.get(job_id)
+        # Another worker owns the job; follow it through the shared state.
+        while snapshot is not None and time.monotonic() < deadline:
+            if snapshot["status"] in (DONE, FAILED) or (started and snapshot["status"] != QUEUED):
+                break
+            await asyncio.sleep(max(SHARED_POLL_INTERVAL, 0.25))
+            snapshot = await self.get(job_id)
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "queued": {priority: len(queue) for priority, queue in self._queues.items()},
+            "running": dict(self._running),
+            "depth": self.depth,
+            "background_depth": self.background_depth,
+            "workers": self.workers,
+            "avg_duration": round(self._avg_duration, 3),
+            "retained": len(self._jobs),
+        }
@@ -0,0 +1,122 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from loguru import logger as log
+from src.Instagram.Records import Post
+
+# Set to 1 to analyze related posts and fetch related profiles while the server is otherwise idle.
+PREFETCH_ENABLED = os.getenv("CHROMLM_PREFETCH", "0") == "1"
+# Related items waiting to be prefetched; the oldest are dropped first since browsing has moved on.
+PREFETCH_QUEUE_DEPTH = int(os.getenv("CHROMLM_PREFETCH_QUEUE_DEPTH", "64"))
+# Related posts and profiles taken from each analyzed post.
+PREFETCH_POSTS = int(os.getenv("CHROMLM_PREFETCH_POSTS", "3"))
+PREFETCH_PROFILES = int(os.getenv("CHROMLM_PREFETCH_PROFILES", "3"))
+# Seconds between checks for spare capacity while prefetching is suspended.
+PREFETCH_IDLE_DELAY = float(os.getenv("CHROMLM_PREFETCH_IDLE_DELAY", "2"))
+
+POST = "post"
+PROFILE = "profile"
+
+Item = Tuple[str, str]
+
+
+class Prefetcher:
+    """Warms the caches with the related posts and profiles of analyzed posts.
+
+    ``offer`` queues what a freshly scraped post links to. A single worker takes the
+    newest item whenever ``suspended()`` returns ``None`` and passes it to
+    ``prefetch_post`` (shortcode) or ``prefetch_profile`` (owner pk); those return
+    ``False`` when the item was already cached. Posts scraped by a prefetch are not
+    offered again, so prefetching never spreads beyond one hop.
+    """
+
+    def __init__(self, prefetch_post: Callable[[str], Awaitable[bool]],
+                 prefetch_profile: Callable[[str], Awaitable[bool]],
+                 suspended: Callable[[], Optional[str]], enabled: bool = PREFETCH_ENABLED,
+                 depth: int = PREFETCH_QUEUE_DEPTH, posts: int = PREFETCH_POSTS, profiles: int = PREFETCH_PROFILES,
+                 idle_delay: float = PREFETCH_IDLE_DELAY):
+        self.prefetch_post = prefetch_post
+        self.prefetch_profile = prefetch_profile
+        self.suspended = suspended
+        self.enabled = enabled
+        self.posts = posts
+        self.profiles = profiles
+        self.idle_delay = idle_delay
+        self._queue: Deque[Item] = deque(maxlen=depth)
+        self._prefetching: Set[str] = set()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._suspended_by: Optional[str] = None
+        self.counters = {"offered": 0, "dropped": 0, "posts": 0, "profiles": 0, "already_cached": 0,
+                         "failed": 0, "suspensions": 0}
+
+    def offer(self, post: Post) -> None:
+        if not self.enabled or post.shortcode in self._prefetching:
+            return
+        items = [(POST, shortcode) for shortcode in post.related[:self.posts] if shortcode]
+        items += [(PROFILE, pk) for pk in post.related_profile_ids[:self.profiles] if pk]
+        for item in items:
+            if item in self._queue:
+                continue
+            if len(self._queue) == self._queue.maxlen:
+                self.counters["dropped"] += 1
+            self._queue.append(item)
+            self.counters["offered"] += 1
+        if items:
+            self._ready.set()
+
+    def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._work(), name="prefetcher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _work(self) -> None:
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            reason = self.suspended()
+            if reason is not None:
+                if reason != self._suspended_by:
+                    log.debug("Prefetching suspended: {}", reason)
+                    self.counters["suspensions"] += 1
+                self._suspended_by = reason
+                await asyncio.sleep(self.idle_delay)
+                continue
+            self._suspended_by = None
+            await self._prefetch(self._queue.pop())
+
+    async def _prefetch(self, item: Item) -> None:
+        kind, key = item
+        if kind == POST:
+            self._prefetching.add(key)
+        try:
+            fetched = await (self.prefetch_post(key) if kind == POST else self.prefetch_profile(key))
+        except Exception as e:
+            log.warning("Prefetching {} {} failed: {}", kind, key, str(e))
+            self.counters["failed"] += 1
+            return
+        finally:
+            self._prefetching.discard(key)
+        if not fetched:
+            self.counters["already_cached"] += 1
+        elif kind == POST:
+            self.counters["posts"] += 1
+        else:
+            self.counters["profiles"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "queued": len(self._queue),
+            "suspended_by": self._suspended_by,
+        }
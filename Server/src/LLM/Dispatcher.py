@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from loguru import logger as log
+from src.Jobs.JobQueue import PRIORITIES, job_priority
+from src.Observability.Metrics import llm_batch_delay, llm_batch_size
+
+# Seconds a classification waits for others to join its batch; 0 sends every request on its own.
+# Off by default: completions already run concurrently, so only batching modes that change the
+# request sent to the model server gain anything from the wait.
+LLM_BATCH_WINDOW = float(os.getenv("CHROMLM_LLM_BATCH_WINDOW", "0"))
+# A batch is sent as soon as it holds this many requests, even before the window ends.
+LLM_BATCH_SIZE = int(os.getenv("CHROMLM_LLM_BATCH_SIZE", "8"))
+# Estimated prompt tokens a combined batch may carry, so its prompt fits the model context.
+LLM_BATCH_TOKENS = int(os.getenv("CHROMLM_LLM_BATCH_TOKENS", "6000"))
+# "parallel" sends a batch as concurrent completions that reach the model server together;
+# "combined" sends it as one completion carrying every post and asking for a verdict per post.
+LLM_BATCH_MODE = os.getenv("CHROMLM_LLM_BATCH_MODE", "parallel")
+
+PARALLEL = "parallel"
+COMBINED = "combined"
+
+Verdict = Dict[str, Any]
+
+
+class _Pending:
+    __slots__ = ("data", "tokens", "future", "enqueued", "priority")
+
+    def __init__(self, data: Any, tokens: int, future: "asyncio.Future[Optional[Verdict]]"):
+        self.data = data
+        self.tokens = tokens
+        self.future = future
+        self.enqueued = time.perf_counter()
+        self.priority = job_priority.get()
+
+
+class BatchDispatcher:
+    """Groups classification requests that arrive within ``window`` seconds of each other.
+
+    A batch closes when the window since its first request ends or it holds ``max_size``
+    requests; in ``combined`` mode also before its prompts would pass ``max_tokens``. In ``parallel`` mode every waiter is then released at once to run its own
+    completion through ``classify_one``, so the model server sees them together and can
+    share the prefill of the identical system prompt. In ``combined`` mode
+    ``classify_many`` answers the whole batch in one completion; a post it returns no
+    usable verdict for, or every post of a failed completion, falls back to ``classify_one``. Completions stay subject to the
+    LLM concurrency limit either way.
+    """
+
+    def __init__(self, classify_one: Callable[[Any], Awaitable[Verdict]],
+                 classify_many: Callable[[List[Any]], Awaitable[List[Optional[Verdict]]]],
+                 window: float = LLM_BATCH_WINDOW, max_size: int = LLM_BATCH_SIZE,
+                 max_tokens: int = LLM_BATCH_TOKENS, mode: str = LLM_BATCH_MODE):
+        if mode not in (PARALLEL, COMBINED):
+            raise ValueError(f"Unknown LLM batch mode {mode!r}, expected {PARALLEL!r} or {COMBINED!r}")
+        self.classify_one = classify_one
+        self.classify_many = classify_many
+        self.window = window
+        self.max_size = max_size
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self._pending: List[_Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._delay_total = 0.0
+        self.counters = {"requests": 0, "batches": 0, "batched_requests": 0, "largest_batch": 0, "fallbacks": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_size > 1
+
+    @property
+    def combined(self) -> bool:
+        """Whether batches are answered by one completion over every post in them."""
+        return self.enabled and self.mode == COMBINED
+
+    def _tokens(self) -> int:
+        return sum(item.tokens for item in self._pending) if self.mode == COMBINED else 0
+
+    async def classify(self, data: Any, tokens: int = 0) -> Verdict:
+        """Classify one prompt of about ``tokens`` tokens as part of a batch."""
+        self.counters["requests"] += 1
+        if not self.enabled:
+            return await self.classify_one(data)
+        loop = asyncio.get_running_loop()
+        item = _Pending(data, tokens, loop.create_future())
+        if self._pending and self._tokens() + tokens > self.max_tokens:
+            self._flush()
+        self._pending.append(item)
+        if len(self._pending) >= self.max_size or self._tokens() >= self.max_tokens:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        try:
+            # Shielded so one waiter going away does not cancel a combined completion others share.
+            verdict = await asyncio.shield(item.future)
+        except asyncio.CancelledError:
+            if item in self._pending:
+                self._pending.remove(item)
+            raise
+        if verdict is None:
+            return await self.classify_one(data)
+        return verdict
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [item for item in self._pending if not item.future.done()]
+        self._pending = []
+        if not batch:
+            return
+        now = time.perf_counter()
+        for item in batch:
+            delay = now - item.enqueued
+            self._delay_total += delay
+            llm_batch_delay.observe(delay, mode=self.mode)
+        llm_batch_size.observe(len(batch), mode=self.mode)
+        self.counters["batches"] += 1
+        self.counters["batched_requests"] += len(batch)
+        self.counters["largest_batch"] = max(self.counters["largest_batch"], len(batch))
+        log.debug("Dispatching a batch of {} classification(s)", len(batch))
+        if self.mode == PARALLEL or len(batch) == 1:
+            for item in batch:
+                item.future.set_result(None)
+            return
+        task = asyncio.create_task(self._run_combined(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_combined(self, batch: List[_Pending]) -> None:
+        # The shared completion waits for an LLM slot as the most urgent post in it would.
+        job_priority.set(lambda: min((item.priority() for item in batch), key=PRIORITIES.index))
+        try:
+            verdicts = await self.classify_many([item.data for item in batch])
+        except Exception as e:
+            log.error("Combined classification of {} posts failed, classifying them one by one: {}",
+                      len(batch), str(e))
+            verdicts = []
+        for index, item in enumerate(batch):
+            verdict = verdicts[index] if index < len(verdicts) else None
+            if verdict is None:
+                self.counters["fallbacks"] += 1
+            if not item.future.done():
+                item.future.set_result(verdict)
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self.counters["batches"]
+        batched = self.counters["batched_requests"]
+        return {
+            **self.counters,
+            "mode": self.mode if self.enabled else "off",
+            "window": self.window,
+            "max_size": self.max_size,
+            "max_tokens": self.max_tokens,
+            "pending": len(self._pending),
+            "avg_batch_size": round(batched / batches, 2) if batches else 0.0,
+            "avg_delay_ms": round(1000 * self._delay_total / batched, 2) if batched else 0.0,
+        }
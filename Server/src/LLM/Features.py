@@ -0,0 +1,41 @@
+import re
+import zlib
+from typing import Any, Dict, Iterator, List, Set
+
+# Kept free of server dependencies: the offline trainer in ModelEvaluation
+# imports this module so training and serving hash identical features.
+
+HASH_BUCKETS = 2 ** 18
+TOKEN_PATTERN = re.compile(r"#?\w+|[^\w\s]", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def ngrams(tokens: List[str], max_n: int = 2) -> Iterator[str]:
+    for n in range(1, max_n + 1):
+        for i in range(len(tokens) - n + 1):
+            yield " ".join(tokens[i:i + n])
+
+
+def feature_text(data: Dict[str, Any]) -> Dict[str, str]:
+    """Text per field of ``DataStandardizer.standardize_instagram_data`` output."""
+    profile = data.get("profile", {})
+    post = data.get("post", {})
+    return {
+        "bio": profile.get("bio") or "",
+        "link": profile.get("bioLinks") or "",
+        "title": post.get("title") or "",
+        "tags": " ".join(post.get("tags") or []),
+        "comments": " ".join(comment.get("comment") or "" for comment in data.get("comments", [])),
+    }
+
+
+def hashed_features(data: Dict[str, Any], buckets: int = HASH_BUCKETS) -> Set[int]:
+    """Binary bag of field-prefixed word uni- and bigrams, hashed into ``buckets`` indices."""
+    features = set()
+    for field, text in feature_text(data).items():
+        for gram in ngrams(tokenize(text)):
+            features.add(zlib.crc32(f"{field}|{gram}".encode("utf-8")) % buckets)
+    return features
@@ -1,57 +1,124 @@
+import asyncio
+import hashlib
 import json
-import sys
-from openai import OpenAI
-from src.DataStandardization.Standardizer import run as standard_data
+import os
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+from src.Aggregators.InstagramAggregator import fetch_post, get_profile
+from src.Cache.ContentCache import content_cache
+from src.Concurrency.Retry import Deadline
+from src.Concurrency.SharedState import SharedSemaphore, shared_state
+from src.Concurrency.SingleFlight import SingleFlight
+from src.DataStandardization.Standardizer import DataStandardizer, run as standard_data
+from src.Instagram.HttpClient import INSTAGRAM_DEADLINE
+from src.Instagram.PostScraperINSTAGRAM import extract_shortcode
+from src.Jobs.JobQueue import priority_rank
+from src.LLM.Dispatcher import BatchDispatcher
+from src.LLM.PreClassifier import pre_classifier
+from src.LLM.PromptBuilder import Prompt, build_prompt, estimate_tokens
+from src.Observability.Logging import LOG_PAYLOADS
+from src.Observability.Metrics import output_tokens, parse_failures, prompt_tokens, stage_timer
 from loguru import logger as log
 
-client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
+LMSTUDIO_BASE_URL = os.getenv("CHROMLM_LMSTUDIO_BASE_URL", "http://localhost:1234/v1")
+LMSTUDIO_API_KEY = os.getenv("CHROMLM_LMSTUDIO_API_KEY", "lm-studio")
+LLM_MODEL = os.getenv("CHROMLM_LLM_MODEL", "model-identifier")
+# Completions allowed in flight at once, across all workers; match what the model server can batch.
+LLM_MAX_CONCURRENCY = int(os.getenv("CHROMLM_LLM_MAX_CONCURRENCY", "2"))
+# Of those, completions only interactive work may run, so a user never waits behind background jobs.
+LLM_INTERACTIVE_RESERVE = int(os.getenv("CHROMLM_LLM_INTERACTIVE_RESERVE", "1"))
+LLM_TIMEOUT = float(os.getenv("CHROMLM_LLM_TIMEOUT", "120"))
+
+SYSTEM_PROMPT = (
+    "You are an expert in identifying multi-level marketing (MLM) schemes. "
+    "Analyze the given social media post for characteristics of MLM and provide your response in valid JSON format only. "
+    "Do not include code block markers or additional text outside the JSON. The JSON should include the following keys: \n"
+    "- 'verdict': A 'Yes' or 'No' indicating if the content is MLM.\n"
+    "- 'certainty': A percentage (0-100) representing how certain you are.\n"
+    "- 'reasoning': An object containing detailed explanations for different factors contributing to your verdict."
+)
+# Starts with SYSTEM_PROMPT so single and combined requests share a cacheable prefix.
+COMBINED_SYSTEM_PROMPT = (
+    SYSTEM_PROMPT + "\n"
+    "You will be given several posts, each introduced by a line 'Post <n>:'. Classify each post on its own and "
+    "respond with a single JSON object whose keys are the post numbers as strings and whose values are the "
+    "JSON objects described above."
+)
+
+_client: Optional[AsyncOpenAI] = None
+llm_governor = SharedSemaphore("llm", shared_state, LLM_MAX_CONCURRENCY, LLM_INTERACTIVE_RESERVE)
+analysis_flight = SingleFlight("analyze_post")
+content_flight = SingleFlight("content_verdict")
+prompt_counters = {"prompts": 0, "tokens": 0, "dropped_tokens": 0, "comments_dropped": 0}
+
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared LM Studio client, creating its connection pool on first use."""
+    global _client
+    if _client is None:
+        log.info("Creating LM Studio client for {}", LMSTUDIO_BASE_URL)
+        _client = AsyncOpenAI(
+            base_url=LMSTUDIO_BASE_URL,
+            api_key=LMSTUDIO_API_KEY,
+            timeout=LLM_TIMEOUT,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY,
+                                    max_keepalive_connections=LLM_MAX_CONCURRENCY),
+                timeout=httpx.Timeout(LLM_TIMEOUT)
+            )
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
 
 def load_standardized_data(file_path):
-    log.info(f"Loading standardized data from {file_path}")
+    log.info("Loading standardized data from {}", file_path)
     with open(file_path, 'r', encoding='utf-8') as file:
         return json.load(file)
 
-def classify_mlm_content(data):
-    log.info("Classifying MLM content")
-    profile = data.get("profile", {})
-    post = data.get("post", {})
-    comments = data.get("comments", [])
-
-    input_message = (
-        f"Profile Bio: {profile.get('bio')}, Follower Count: {profile.get('followerCount')}\n"
-        f"Post Title: {post.get('title')}\n"
-        f"Post Tags: {', '.join(post.get('tags')) if post.get('tags') else 'None'}\n"
-        f"Comments: {[comment['comment'] for comment in comments]}"
-    )
-
-    model_identifier = "model-identifier"  
-    log.debug(f"Input message for model: {input_message}")
-    response = client.chat.completions.create(
-        model=model_identifier,
-        messages=[
-            {"role": "system",
-             "content": (
-                 "You are an expert in identifying multi-level marketing (MLM) schemes. "
-                 "Analyze the given social media post for characteristics of MLM and provide your response in valid JSON format only. "
-                 "Do not include code block markers or additional text outside the JSON. The JSON should include the following keys: \n"
-                 "- 'verdict': A 'Yes' or 'No' indicating if the content is MLM.\n"
-                 "- 'certainty': A percentage (0-100) representing how certain you are.\n"
-                 "- 'reasoning': An object containing detailed explanations for different factors contributing to your verdict."
-             )},
-            {"role": "user", "content": input_message}
-        ],
-        temperature=0.1,
-        stream=False
-    )
+def build_input_prompt(data) -> Prompt:
+    prompt = build_prompt(data)
+    log.info("Prompt uses ~{} tokens, dropped ~{} tokens and {} comments",
+             prompt.tokens, prompt.dropped_tokens, prompt.comments_dropped)
+    prompt_tokens.observe(prompt.tokens)
+    prompt_counters["prompts"] += 1
+    prompt_counters["tokens"] += prompt.tokens
+    prompt_counters["dropped_tokens"] += prompt.dropped_tokens
+    prompt_counters["comments_dropped"] += prompt.comments_dropped
+    return prompt
 
-    result = response.choices[0].message.content
+
+def build_messages(input_message):
+    if LOG_PAYLOADS:
+        log.debug("Input message for model: {}", input_message)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": input_message}
+    ]
+
+
+def _strip_code_block(result):
+    if result.startswith("```json") and result.endswith("```"):
+        return result[7:-3].strip()
+    return result
+
+
+def parse_verdict(result):
     try:
-        if result.startswith("```json") and result.endswith("```"):
-            result = result[7:-3].strip()
-        result_json = json.loads(result)
+        result_json = json.loads(_strip_code_block(result))
         log.info("Successfully classified MLM content")
     except json.JSONDecodeError:
         log.error("Failed to parse model response as JSON")
+        parse_failures.inc()
         result_json = {
             "verdict": "Error",
             "certainty": 0,
@@ -63,17 +130,199 @@ def classify_mlm_content(data):
     return result_json
 
 
-async def analyze_post(url):
-    log.remove()
-    log.add(sys.stderr, level="DEBUG")
-    log.info("Sending data for analysis.")
+def parse_verdicts(result, count):
+    """Split a combined completion into one verdict per post, ``None`` where the model gave none."""
+    try:
+        results = json.loads(_strip_code_block(result))
+    except json.JSONDecodeError:
+        log.error("Failed to parse combined model response as JSON")
+        parse_failures.inc()
+        return [None] * count
+    if not isinstance(results, dict):
+        results = {}
+    verdicts = []
+    for index in range(1, count + 1):
+        verdict = results.get(str(index))
+        verdicts.append(verdict if isinstance(verdict, dict) and "verdict" in verdict else None)
+    log.info("Combined completion classified {} of {} posts", sum(v is not None for v in verdicts), count)
+    return verdicts
+
+
+async def complete(messages):
+    """Run one non-streaming completion under the LLM concurrency limit and return its text."""
+    with stage_timer("llm_wait"):
+        slot = await llm_governor.acquire(priority_rank())
+    try:
+        with stage_timer("llm_completion"):
+            response = await get_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0.1,
+                stream=False,
+                timeout=LLM_TIMEOUT
+            )
+    finally:
+        await llm_governor.release(slot)
+
+    result = response.choices[0].message.content
+    output_tokens.observe(response.usage.completion_tokens if response.usage else estimate_tokens(result))
+    return result
+
+
+def fingerprint(system_prompt: str) -> str:
+    return hashlib.sha256(f"{LLM_MODEL}\n{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+# Part of every content cache key, so changing the model or its instructions stops reuse of older verdicts.
+# Each prompt files its verdicts under its own fingerprint: a verdict is only reused for the prompt that produced it.
+MODEL_FINGERPRINT = fingerprint(SYSTEM_PROMPT)
+COMBINED_FINGERPRINT = fingerprint(COMBINED_SYSTEM_PROMPT)
+
+
+def content_key(prompt: Prompt, model_fingerprint: str = MODEL_FINGERPRINT) -> str:
+    return f"{model_fingerprint}:{prompt.content_hash}"
+
+
+async def classify_one(prompt: Prompt):
+    log.info("Classifying MLM content")
+    verdict = parse_verdict(await complete(build_messages(prompt.text)))
+    await content_cache.set(content_key(prompt), verdict)
+    return verdict
+
+
+async def classify_many(prompts: List[Prompt]):
+    log.info("Classifying {} posts in one completion", len(prompts))
+    input_message = "\n\n".join(f"Post {index}:\n{prompt.text}" for index, prompt in enumerate(prompts, 1))
+    if LOG_PAYLOADS:
+        log.debug("Combined input message for model: {}", input_message)
+    messages = [
+        {"role": "system", "content": COMBINED_SYSTEM_PROMPT},
+        {"role": "user", "content": input_message}
+    ]
+    verdicts = parse_verdicts(await complete(messages), len(prompts))
+    for prompt, verdict in zip(prompts, verdicts):
+        if verdict is not None:
+            await content_cache.set(content_key(prompt, COMBINED_FINGERPRINT), verdict)
+    return verdicts
+
+
+llm_dispatcher = BatchDispatcher(classify_one, classify_many)
+
+
+async def reused_verdict(prompt: Prompt, combined: bool = False):
+    """Return the model's earlier verdict for identical prompt content, if it is still cached.
+
+    ``combined`` also accepts a verdict from the combined prompt, for callers that may be batched into it.
+    """
+    verdict = await content_cache.get(content_key(prompt))
+    if verdict is None and combined:
+        verdict = await content_cache.get(content_key(prompt, COMBINED_FINGERPRINT))
+    if verdict is None:
+        return None
+    log.info("Reusing the verdict for unchanged content {}", prompt.content_hash)
+    return {**verdict, "tier": "content_cache", "content_hash": prompt.content_hash}
+
+
+async def classify_mlm_content(data, force: bool = False):
+    """Classify standardized post data; ``force`` asks the model even when the content cache has a verdict."""
+    prompt = build_input_prompt(data)
+
+    async def classify():
+        reused = None if force else await reused_verdict(prompt, llm_dispatcher.combined)
+        if reused is not None:
+            return reused
+        # Stored in the content cache by classify_one or classify_many, under their prompt's fingerprint.
+        verdict = await llm_dispatcher.classify(prompt, prompt.tokens)
+        return {**verdict, "tier": "llm", "content_hash": prompt.content_hash}
+
+    if force:
+        # Not shared, since a concurrent caller's flight may be answering from the content cache.
+        return await classify()
+    # Posts with identical content in flight at once share one completion.
+    return await content_flight.do(content_key(prompt), classify)
+
+
+async def stream_mlm_classification(input_message) -> AsyncIterator[str]:
+    """Yield completion tokens as LM Studio produces them."""
+    log.info("Streaming MLM classification")
+    messages = build_messages(input_message)
+    with stage_timer("llm_wait"):
+        slot = await llm_governor.acquire(priority_rank())
     try:
-        log.info("Loading data for analysis.")
+        with stage_timer("llm_completion"):
+            stream = await get_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0.1,
+                stream=True,
+                timeout=LLM_TIMEOUT
+            )
+            chunks = 0
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        chunks += 1
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Closing the stream aborts generation when the consumer goes away.
+                await stream.close()
+                output_tokens.observe(chunks)
+    finally:
+        await llm_governor.release(slot)
+
+
+async def stream_analysis(url, force: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+    """Run the analysis pipeline stage by stage, yielding ``(event, payload)`` as each one completes."""
+    deadline = Deadline(INSTAGRAM_DEADLINE)
+    post_data = await fetch_post(url, deadline)
+    yield "post", {"shortcode": post_data.shortcode, "username": post_data.username}
+
+    pk = post_data.pk
+    if not pk:
+        raise ValueError("Failed to fetch Instagram data")
+    profile_data = await get_profile(pk, deadline)
+    yield "profile", {"username": profile_data.username}
+
+    data = DataStandardizer.standardize_data("instagram", {"profile_data": profile_data, "post_data": post_data})
+    yield "standardized", data
+
+    with stage_timer("pre_classifier"):
+        verdict = pre_classifier.classify(data)
+    if verdict is None:
+        prompt = build_input_prompt(data)
+        verdict = None if force else await reused_verdict(prompt)
+    if verdict is None:
+        tokens = []
+        async for token in stream_mlm_classification(prompt.text):
+            tokens.append(token)
+            yield "token", token
+        verdict = parse_verdict("".join(tokens))
+        await content_cache.set(content_key(prompt), verdict)
+        verdict = {**verdict, "tier": "llm", "content_hash": prompt.content_hash}
+    yield "verdict", verdict
+
+
+async def run_analysis(url, scrape_limit: Optional[asyncio.Semaphore] = None,
+                       llm_limit: Optional[asyncio.Semaphore] = None, force: bool = False):
+    log.info("Loading data for analysis.")
+    async with scrape_limit or nullcontext():
         data = await standard_data(url)
-        analysis = classify_mlm_content(data)
-        log.info(f"MLM Analysis: {json.dumps(analysis, indent=2)}")
-        log.success("Successfully analyzed data.")
-        return analysis
+    with stage_timer("pre_classifier"):
+        analysis = pre_classifier.classify(data)
+    if analysis is None:
+        async with llm_limit or nullcontext():
+            analysis = await classify_mlm_content(data, force)
+    log.info("MLM Analysis: verdict {} ({}% certainty, tier {})",
+             analysis.get("verdict"), analysis.get("certainty"), analysis.get("tier"))
+    log.success("Successfully analyzed data.")
+    return analysis
+
+
+async def analyze_post(url, scrape_limit: Optional[asyncio.Semaphore] = None,
+                       llm_limit: Optional[asyncio.Semaphore] = None, force: bool = False):
+    log.info("Sending data for analysis.")
+    try:
+        return await analysis_flight.do(extract_shortcode(url), lambda: run_analysis(url, scrape_limit, llm_limit, force))
     except Exception as e:
         log.exception("An error occurred during execution.")
         return {"error": str(e)}
\ No newline at end of file
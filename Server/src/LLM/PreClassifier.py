@@ -0,0 +1,71 @@
+import json
+import math
+import os
+from typing import Any, Dict, Optional
+
+from loguru import logger as log
+from src.LLM.Features import hashed_features
+
+PRECLASSIFIER_PATH = os.getenv("CHROMLM_PRECLASSIFIER_PATH", "models/preclassifier.json")
+# Calibrated probability of the predicted class above which the LLM is skipped.
+PRECLASSIFIER_THRESHOLD = float(os.getenv("CHROMLM_PRECLASSIFIER_THRESHOLD", "0.97"))
+
+
+class PreClassifier:
+    """Hashed n-gram logistic model that answers clear-cut posts without the LLM.
+
+    Weights come from ``ModelEvaluation/train_preclassifier.py``. Without a
+    model file every post is escalated.
+    """
+
+    def __init__(self, path: str = PRECLASSIFIER_PATH, threshold: float = PRECLASSIFIER_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.model: Optional[Dict[str, Any]] = None
+        self.counters = {"answered": 0, "escalated": 0}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            log.info("No pre-classifier model at {}, every post goes to the LLM", self.path)
+            return
+        with open(self.path, "r", encoding="utf-8") as file:
+            model = json.load(file)
+        model["weights"] = {int(index): weight for index, weight in model["weights"].items()}
+        self.model = model
+        log.info("Loaded pre-classifier from {} ({} weights)", self.path, len(model["weights"]))
+
+    def probability(self, data: Dict[str, Any]) -> Optional[float]:
+        """Calibrated probability that the post is MLM, or ``None`` without a model."""
+        if self.model is None:
+            return None
+        weights = self.model["weights"]
+        score = self.model["bias"] + sum(weights.get(index, 0.0)
+                                         for index in hashed_features(data, self.model["buckets"]))
+        # Platt scaling fitted on held-out data at training time.
+        z = self.model["platt_a"] * score + self.model["platt_b"]
+        return 1 / (1 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def classify(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return a verdict when confident enough, otherwise ``None`` to escalate."""
+        probability = self.probability(data)
+        if probability is None or max(probability, 1 - probability) < self.threshold:
+            self.counters["escalated"] += 1
+            return None
+        self.counters["answered"] += 1
+        is_mlm = probability >= 0.5
+        certainty = round(100 * (probability if is_mlm else 1 - probability))
+        return {
+            "verdict": "Yes" if is_mlm else "No",
+            "certainty": certainty,
+            "reasoning": {
+                "pre_classifier": f"Matched {'MLM' if is_mlm else 'non-MLM'} wording with {certainty}% calibrated confidence."
+            },
+            "tier": "pre_classifier",
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "loaded": self.model is not None, "threshold": self.threshold}
+
+
+pre_classifier = PreClassifier()
@@ -0,0 +1,138 @@
+import hashlib
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+# Rough token budget of the user message; the system prompt is not counted.
+PROMPT_TOKEN_BUDGET = int(os.getenv("CHROMLM_PROMPT_TOKEN_BUDGET", "1500"))
+PROMPT_BIO_TOKENS = int(os.getenv("CHROMLM_PROMPT_BIO_TOKENS", "150"))
+PROMPT_CAPTION_TOKENS = int(os.getenv("CHROMLM_PROMPT_CAPTION_TOKENS", "400"))
+PROMPT_TAG_LIMIT = int(os.getenv("CHROMLM_PROMPT_TAG_LIMIT", "30"))
+PROMPT_COMMENT_TOKENS = int(os.getenv("CHROMLM_PROMPT_COMMENT_TOKENS", "80"))
+# Average characters per token used to estimate prompt size without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+SIGNAL_PATTERN = re.compile(
+    r"\b(dm|dms|inbox|message me|link in bio|check (?:your|my) (?:dm|bio)|join|team|opportunity|business|"
+    r"income|earn|boss ?babe|financial freedom|side hustle|work from home|wfh|discount|code)\b",
+    re.IGNORECASE
+)
+WORD_PATTERN = re.compile(r"\w", re.UNICODE)
+
+
+@dataclass
+class Prompt:
+    text: str
+    tokens: int
+    dropped_tokens: int
+    comments_used: int
+    comments_dropped: int
+    # Hash of what the prompt says, with the follower count bucketed so follower drift
+    # alone does not count as new content.
+    content_hash: str
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def trim(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to roughly ``max_tokens`` at a word boundary."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    words = head.rsplit(None, 1)
+    # No boundary to cut at when the head is one word or nothing but whitespace.
+    cut = words[0] if len(words) == 2 else head.rstrip()
+    return cut + "…"
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def comment_score(comment: Dict[str, Any], owner: str) -> float:
+    text = comment.get("comment") or ""
+    score = min(len(text), 200) / 50
+    score += 3 * len(SIGNAL_PATTERN.findall(text))
+    if owner and any(reply.get("user") == owner for reply in comment.get("replies", [])):
+        score += 4
+    return score
+
+
+def rank_comments(comments: List[Dict[str, Any]], owner: str) -> Tuple[List[str], int]:
+    """Return unique, non emoji-only comment texts by descending signal, plus how many were discarded."""
+    seen = set()
+    ranked = []
+    for index, comment in enumerate(comments):
+        text = (comment.get("comment") or "").strip()
+        key = normalize(text)
+        if not WORD_PATTERN.search(key) or key in seen:
+            continue
+        seen.add(key)
+        # The index breaks ties so the order never depends on anything but the input.
+        ranked.append((-comment_score(comment, owner), index, text))
+    ranked.sort()
+    return [text for _, _, text in ranked], len(comments) - len(ranked)
+
+
+def follower_bucket(count: Any) -> Any:
+    """Round a follower count down to one significant digit, e.g. 12345 to 10000."""
+    if not isinstance(count, int) or count < 10:
+        return count
+    magnitude = 10 ** (len(str(count)) - 1)
+    return count // magnitude * magnitude
+
+
+def prompt_header(bio: Any, followers: Any, title: Any, tags: List[str]) -> str:
+    return (
+        f"Profile Bio: {trim(bio, PROMPT_BIO_TOKENS) if bio else None}, "
+        f"Follower Count: {followers}\n"
+        f"Post Title: {trim(title, PROMPT_CAPTION_TOKENS) if title else None}\n"
+        f"Post Tags: {', '.join(tags) if tags else 'None'}\n"
+        f"Comments:"
+    )
+
+
+def build_prompt(data: Dict[str, Any], budget: int = PROMPT_TOKEN_BUDGET) -> Prompt:
+    profile = data.get("profile", {})
+    post = data.get("post", {})
+    bio = profile.get("bio")
+    title = post.get("title")
+    tags = (post.get("tags") or [])[:PROMPT_TAG_LIMIT]
+
+    header = prompt_header(bio, profile.get("followerCount"), title, tags)
+    original_tokens = estimate_tokens(
+        f"Profile Bio: {bio}, Follower Count: {profile.get('followerCount')}\n"
+        f"Post Title: {title}\n"
+        f"Post Tags: {', '.join(post.get('tags') or [])}\n"
+        f"Comments:" + "".join(f"\n- {comment.get('comment')}" for comment in data.get("comments", []))
+    )
+
+    ranked, discarded = rank_comments(data.get("comments", []), profile.get("username"))
+    remaining = budget - estimate_tokens(header)
+    lines = []
+    for text in ranked:
+        line = f"\n- {trim(text, PROMPT_COMMENT_TOKENS)}"
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            # Keep scanning: a shorter, lower-ranked comment may still fit.
+            continue
+        lines.append(line)
+        remaining -= cost
+
+    body = "".join(lines) if lines else " None"
+    text = header + body
+    tokens = estimate_tokens(text)
+    content = prompt_header(bio, follower_bucket(profile.get("followerCount")), title, tags) + body
+    return Prompt(
+        text=text,
+        tokens=tokens,
+        dropped_tokens=max(0, original_tokens - tokens),
+        comments_used=len(lines),
+        comments_dropped=discarded + len(ranked) - len(lines),
+        content_hash=hashlib.sha256(content.encode("utf-8")).hexdigest()
+    )
@@ -0,0 +1,49 @@
+import os
+import random
+import sys
+from typing import Any, Dict
+
+from loguru import logger as log
+from src.Observability.Metrics import request_id
+
+LOG_LEVEL = os.getenv("CHROMLM_LOG_LEVEL", "INFO").upper()
+# One JSON object per line; set to 0 for human-readable lines during development.
+LOG_JSON = os.getenv("CHROMLM_LOG_JSON", "1") == "1"
+# Log request bodies and raw upstream payloads at DEBUG. Off by default: they are large.
+LOG_PAYLOADS = os.getenv("CHROMLM_LOG_PAYLOADS", "0") == "1"
+# Fraction of DEBUG records that are kept when the level lets them through. Ignored while
+# LOG_PAYLOADS is on, since a payload log with random gaps is no use for debugging.
+LOG_DEBUG_SAMPLE = float(os.getenv("CHROMLM_LOG_DEBUG_SAMPLE", "0.1"))
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | {extra[request_id]} | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+
+
+def _add_request_id(record: Dict[str, Any]) -> None:
+    record["extra"].setdefault("request_id", request_id.get())
+
+
+def _sample(record: Dict[str, Any]) -> bool:
+    return LOG_PAYLOADS or record["level"].no > 10 or random.random() < LOG_DEBUG_SAMPLE
+
+
+def configure_logging() -> None:
+    """Install the process's only sink; call once at startup.
+
+    Records are handed to a background thread (``enqueue=True``), so the
+    serialization and the stderr write happen off the event loop.
+    """
+    log.remove()
+    log.configure(patcher=_add_request_id)
+    log.add(
+        sys.stderr,
+        level=LOG_LEVEL,
+        serialize=LOG_JSON,
+        format="{message}" if LOG_JSON else TEXT_FORMAT,
+        filter=_sample,
+        enqueue=True,
+        backtrace=False,
+        diagnose=False,
+    )
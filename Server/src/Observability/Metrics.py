@@ -0,0 +1,150 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger as log
+
+# Identifier of the HTTP request being served; asyncio tasks inherit it, so
+# work started on behalf of a request (single-flight calls included) keeps it.
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 1536, 2048, 4096, 8192)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        values = self._values or {(): 0}
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # Per label set: counts per bucket (non-cumulative), sum, count.
+        self._values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text exposition format.
+
+    Besides its own counters and histograms it renders the numeric fields of
+    stats dictionaries registered as collectors, e.g. cache and retry counters.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Dict[str, Any]]] = []
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", documentation)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", documentation, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Dict[str, Any]]) -> None:
+        self._collectors.append(collector)
+
+    def _flatten(self, stats: Dict[str, Any], path: str) -> Iterator[Tuple[str, float]]:
+        for key, value in stats.items():
+            name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{path}_{key}")
+            if isinstance(value, dict):
+                yield from self._flatten(value, name)
+            elif isinstance(value, (int, float)):
+                yield name, float(value)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collector in self._collectors:
+            for name, value in self._flatten(collector(), self.prefix):
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry("chromlm")
+stage_seconds = registry.histogram("stage_seconds", "Time spent in each analysis pipeline stage.")
+http_request_seconds = registry.histogram("http_request_seconds", "Time to response headers per endpoint.")
+prompt_tokens = registry.histogram("prompt_tokens", "Estimated tokens in the user prompt.", TOKEN_BUCKETS)
+output_tokens = registry.histogram("llm_output_tokens", "Tokens generated per completion.", TOKEN_BUCKETS)
+llm_batch_size = registry.histogram("llm_batch_size", "Classifications dispatched to the model together.",
+                                    BATCH_BUCKETS)
+llm_batch_delay = registry.histogram("llm_batch_delay_seconds", "Time a classification waited for its batch to close.")
+parse_failures = registry.counter("llm_parse_failures_total", "Completions that were not valid verdict JSON.")
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Record how long a pipeline stage took."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage, outcome=outcome)
+        log.bind(stage=stage, outcome=outcome, duration_ms=round(1000 * elapsed, 1)).info(
+            "Stage {} finished ({}) in {:.1f} ms", stage, outcome, 1000 * elapsed)
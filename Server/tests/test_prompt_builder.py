@@ -0,0 +1,22 @@
+from src.LLM.PromptBuilder import CHARS_PER_TOKEN, trim
+
+
+def test_trim_keeps_short_text():
+    assert trim("short caption", 10) == "short caption"
+
+
+def test_trim_cuts_at_word_boundary():
+    text = "word " * 20
+    cut = trim(text, 2)
+    assert cut.endswith("…")
+    assert len(cut) <= 2 * CHARS_PER_TOKEN + 1
+    assert cut[:-1].split() == ["word"]
+
+
+def test_trim_handles_whitespace_only_head():
+    text = " " * 50 + "\n" * 50 + "caption after a long gap"
+    assert trim(text, 5) == "…"
+
+
+def test_trim_without_boundary_cuts_mid_word():
+    assert trim("x" * 100, 2) == "x" * 2 * CHARS_PER_TOKEN + "…"
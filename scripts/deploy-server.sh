@@ -33,9 +33,7 @@ print_error() {
     echo -e "${RED}[ERROR]${NC} $1"
 }
 
-deploy_local() {
-    print_status "Deploying MLM Detector server locally..."
-    
+setup_server() {
     cd ../Server || { print_error "Server directory not found"; exit 1; }
     
     PYTHON_CMD="python"
@@ -72,21 +70,37 @@ deploy_local() {
             exit 0
         fi
     fi
-    
+}
+
+deploy_local() {
+    print_status "Deploying MLM Detector server locally..."
+    setup_server
+
     print_status "Starting backend server..."
     $PYTHON_CMD -m uvicorn src.Backend.backend:app --host 127.0.0.1 --port 8000 --reload
-    
+
     deactivate
 }
 
+deploy_production() {
+    print_status "Deploying MLM Detector server for production..."
+    setup_server
+
+    print_status "Starting ${CHROMLM_WORKERS:-one per core} backend workers on ${CHROMLM_BIND:-127.0.0.1:8000}..."
+    exec gunicorn -c gunicorn.conf.py src.Backend.backend:app
+}
+
 main() {
     case "$DEPLOY_TARGET" in
         local)
             deploy_local
             ;;
+        production)
+            deploy_production
+            ;;
         *)
             print_error "Unknown deployment target: $DEPLOY_TARGET"
-            print_status "Valid targets are: local"
+            print_status "Valid targets are: local, production"
             exit 1
             ;;
     esac